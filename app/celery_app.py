@@ -1,10 +1,14 @@
 # app/celery_app.py
 
 from celery import Celery
-from app.config import settings
+from celery.signals import worker_process_init
+from app.config import get_settings
+from app.database import reset_clients
+from app.sync_mongo import reset_sync_client
 
 # Example, let's say we're using Redis broker:
 # settings.redis_url might look like 'redis://localhost:6379/0'
+settings = get_settings()
 celery_app = Celery(
     "zance",
     broker=settings.redis_url,
@@ -19,4 +23,32 @@ celery_app.conf.update(
     result_serializer="json",
     timezone="UTC",
     enable_utc=True,
+    # Keep broker connections warm and detect dead ones quickly.
+    broker_transport_options={
+        "visibility_timeout": 3600,
+        "socket_keepalive": True,
+        "health_check_interval": 10,
+    },
+    broker_connection_retry_on_startup=True,
+    # Namespace result keys and keep result payloads minimal.
+    result_backend_transport_options={"global_keyprefix": "zance:"},
+    result_extended=False,
 )
+
+# Tasks are I/O-bound (Mongo writes, sleeps between chunks), so run the worker
+# on the gevent pool rather than prefork:
+#   celery -A app.celery_app worker -P gevent -c 500
+# The pool must be chosen with -P: Celery only applies gevent's monkey patches
+# when the pool is given on the command line, not through worker_pool.
+
+
+@worker_process_init.connect
+def reset_mongo_clients(**kwargs):
+    """
+    Drop MongoDB clients inherited from the parent so each forked worker opens its own pool.
+
+    The tasks use the synchronous client in app.sync_mongo; the async clients
+    are cleared too in case a task ever drives an event loop.
+    """
+    reset_sync_client()
+    reset_clients()
@@ -1,6 +1,7 @@
 # app/config.py
 
-from pydantic_settings import BaseSettings
+from functools import lru_cache
+from pydantic_settings import BaseSettings, SettingsConfigDict
 from pydantic import Field
 
 
@@ -8,18 +9,48 @@ class Settings(BaseSettings):
     # MongoDB URI: defaults to local if not provided.
     mongo_uri: str = Field("mongodb://localhost:27017", env="MONGO_URI")
     mongo_db_name: str = Field("remindria", env="MONGO_DB_NAME")
+    # MongoDB connection pool and timeouts (milliseconds).
+    mongo_max_pool_size: int = Field(100, env="MONGO_MAX_POOL_SIZE")
+    mongo_min_pool_size: int = Field(20, env="MONGO_MIN_POOL_SIZE")
+    mongo_socket_timeout_ms: int = Field(20000, env="MONGO_SOCKET_TIMEOUT_MS")
+    mongo_server_selection_timeout_ms: int = Field(
+        3000, env="MONGO_SERVER_SELECTION_TIMEOUT_MS"
+    )
+    mongo_wait_queue_timeout_ms: int = Field(2000, env="MONGO_WAIT_QUEUE_TIMEOUT_MS")
+    # Wire compression, in order of preference; the server picks the first it supports.
+    mongo_compressors: str = Field("zstd,zlib", env="MONGO_COMPRESSORS")
+    mongo_zlib_compression_level: int = Field(6, env="MONGO_ZLIB_COMPRESSION_LEVEL")
     # Redis URL: defaults to local if not provided.
     redis_url: str = Field("redis://localhost:6379", env="REDIS_URL")
+    # Upper bound on the cache client's pooled connections; callers wait for a
+    # free one instead of opening more.
+    redis_max_connections: int = Field(64, env="REDIS_MAX_CONNECTIONS")
+    # Concurrent publishes are pipelined in batches of up to this many messages,
+    # waiting at most redis_batch_window_ms for a batch to fill.
+    redis_batch_size: int = Field(32, env="REDIS_BATCH_SIZE")
+    redis_batch_window_ms: float = Field(3, env="REDIS_BATCH_WINDOW_MS")
+    # Threads in each worker process's default executor, which runs the
+    # blocking calls awaited through asyncio.to_thread (e.g. Celery .delay).
+    thread_pool_size: int = Field(64, env="THREAD_POOL_SIZE")
     # OpenAI API Key: must be provided.
     openai_api_key: str = Field(..., env="OPENAI_API_KEY")
     # JWT Secret key: defaults to a placeholder if not provided.
     secret_key: str = Field("your_jwt_secret", env="SECRET_KEY")
 
     openai_model: str = Field("gpt-4o-mini", env="OPENAI_MODEL")
+    # Number of most recent non-system messages sent to the model with each
+    # request; the first system message is always kept.
+    history_window: int = Field(20, env="HISTORY_WINDOW")
+    # Longer message bodies are cut to their head and tail before being sent.
+    max_message_chars: int = Field(3000, env="MAX_MESSAGE_CHARS")
 
-    class Config:
-        env_file = ".env"  # Tells pydantic to load variables from .env
+    # Load variables from .env; frozen so one instance can be shared safely.
+    model_config = SettingsConfigDict(env_file=".env", frozen=True)
 
 
-# Instantiate the settings so other modules can import them.
-settings = Settings()
+@lru_cache(maxsize=1)
+def get_settings() -> Settings:
+    """
+    Return the application settings, reading the environment and .env only on first call.
+    """
+    return Settings()
@@ -1,14 +1,106 @@
 # app/database.py
 
-from motor.motor_asyncio import AsyncIOMotorClient
-from app.config import settings  # Import settings from config.py
+import asyncio
+import weakref
+from pymongo import AsyncMongoClient
+from app.config import get_settings
 
-# Create an instance of AsyncIOMotorClient using the configured MongoDB URI.
-client = AsyncIOMotorClient(settings.mongo_uri)
-db_name = settings.mongo_db_name  # Get the database name from settings.
+# One AsyncMongoClient per running event loop. The client is created lazily on
+# first use, so importing this module (from uvicorn, Celery or a script) never
+# binds a connection pool to the wrong loop.
+_clients: "weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, AsyncMongoClient]" = (
+    weakref.WeakKeyDictionary()
+)
 
-# Set up the database instance.
-db = client.get_database(db_name)
+
+def mongo_client_options() -> dict:
+    """
+    Keyword arguments shared by the async and sync MongoDB clients.
+
+    PyMongo already sets TCP_NODELAY and SO_KEEPALIVE on every pooled socket,
+    so only the pool size, timeouts and wire compression need configuring.
+    """
+    settings = get_settings()
+    return {
+        "maxPoolSize": settings.mongo_max_pool_size,
+        "minPoolSize": settings.mongo_min_pool_size,
+        "socketTimeoutMS": settings.mongo_socket_timeout_ms,
+        "serverSelectionTimeoutMS": settings.mongo_server_selection_timeout_ms,
+        "waitQueueTimeoutMS": settings.mongo_wait_queue_timeout_ms,
+        "compressors": settings.mongo_compressors,
+        "zlibCompressionLevel": settings.mongo_zlib_compression_level,
+    }
+
+
+def get_client() -> AsyncMongoClient:
+    """
+    Return the MongoDB client bound to the running event loop, creating it on first use.
+    """
+    loop = asyncio.get_running_loop()
+    client = _clients.get(loop)
+    if client is None:
+        client = AsyncMongoClient(get_settings().mongo_uri, **mongo_client_options())
+        _clients[loop] = client
+    return client
+
+
+def get_db():
+    """
+    Return the application database on the client bound to the running event loop.
+    """
+    return get_client().get_database(get_settings().mongo_db_name)
+
+
+async def connect_to_mongo():
+    """
+    Open the client's connection pool. Called from the FastAPI lifespan on startup.
+
+    The ping waits for server selection and checks out a first pooled
+    connection, so the first request doesn't pay for the handshake; the pool
+    then fills up to minPoolSize in the background.
+    """
+    client = get_client()
+    await client.aconnect()
+    await client.admin.command("ping")
+
+
+async def close_mongo_connection():
+    """
+    Close the client bound to the running event loop. Called from the FastAPI lifespan on shutdown.
+    """
+    client = _clients.pop(asyncio.get_running_loop(), None)
+    if client is not None:
+        await client.close()
+
+
+async def init_indexes():
+    """
+    Create the indexes the repositories rely on. Called from the FastAPI lifespan on startup.
+
+    create_index is a no-op when an identical index already exists, so every
+    worker process can run this safely.
+    """
+    db = get_db()
+    await asyncio.gather(
+        db.conversations.create_index([("participants", 1), ("created_at", -1)]),
+        db.messages.create_index([("conversation_id", 1), ("timestamp", 1)]),
+        db.ais.create_index("name", unique=True),
+        # Login looks users up by username and signup by phone number.
+        # Usernames may repeat by design; phone numbers are unique, and
+        # register_user relies on this index to reject duplicates.
+        db.users.create_index("username"),
+        db.users.create_index("phone_number", unique=True),
+    )
+
+
+def reset_clients():
+    """
+    Forget every cached client without closing it.
+
+    Used in freshly forked worker processes so they open their own sockets
+    instead of sharing the parent's.
+    """
+    _clients.clear()
 
 
 async def test_connection():
@@ -16,7 +108,7 @@ async def test_connection():
     Test the connection to MongoDB by listing the collections.
     """
     try:
-        collections = await db.list_collection_names()
+        collections = await get_db().list_collection_names()
         print("Connected to MongoDB. Collections available:", collections)
     except Exception as e:
         print("Error connecting to MongoDB:", e)
@@ -0,0 +1,39 @@
+# app/logging_config.py
+
+import logging
+from logging.handlers import QueueHandler, QueueListener
+from queue import SimpleQueue
+from typing import Optional
+
+_listener: Optional[QueueListener] = None
+
+
+def start_queue_logging() -> None:
+    """
+    Route the root logger through a queue so handler I/O runs on a background thread.
+
+    The root logger's current handlers (or a stderr StreamHandler if it has none)
+    are moved behind a QueueListener; log calls on the event loop only enqueue
+    the record.
+    """
+    global _listener
+    if _listener is not None:
+        return
+    root = logging.getLogger()
+    handlers = root.handlers[:] or [logging.StreamHandler()]
+    for handler in root.handlers[:]:
+        root.removeHandler(handler)
+    queue = SimpleQueue()
+    root.addHandler(QueueHandler(queue))
+    _listener = QueueListener(queue, *handlers, respect_handler_level=True)
+    _listener.start()
+
+
+def stop_queue_logging() -> None:
+    """
+    Flush queued records and stop the background logging thread.
+    """
+    global _listener
+    if _listener is not None:
+        _listener.stop()
+        _listener = None
@@ -1,20 +1,92 @@
 # app/main.py (snippet)
-from fastapi import FastAPI
-from app.routes.user import router as user_router
-from app.routes.chat import router as chat_router
-from app.routes.ai import router as ai_router
-from app.routes.ai_chat import router as ai_chat_router
-from app.routes.conversation import router as conversation_router
+import asyncio
+import importlib
+import logging
+from typing import Dict
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import asynccontextmanager
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse
+from app.config import get_settings
+from app.database import connect_to_mongo, close_mongo_connection, init_indexes
+from app.logging_config import start_queue_logging, stop_queue_logging
+from app.repositories.chat_repository import flush_pending_messages
 
-app = FastAPI(title="Zance")
+# (module, prefix, tags) for every router. The route modules pull in the OpenAI
+# SDK, Redis and the services, so they are imported in the lifespan rather
+# than when this module is imported.
+ROUTE_MODULES = [
+    ("app.routes.user", "/users", ["Users"]),
+    ("app.routes.chat", "/chat", ["Chat"]),
+    ("app.routes.conversation", "/conversation", ["Conversation"]),
+    ("app.routes.ai", "/ai", ["AI"]),
+    ("app.routes.ai_chat", "/chat/ai", ["AI Chat"]),
+]
 
-app.include_router(user_router, prefix="/users", tags=["Users"])
-app.include_router(chat_router, prefix="/chat", tags=["Chat"])
-app.include_router(conversation_router, prefix="/conversation", tags=["Conversation"])
-app.include_router(ai_router, prefix="/ai", tags=["AI"])
-app.include_router(ai_chat_router, prefix="/chat/ai", tags=["AI Chat"])
+
+def register_routers(app: FastAPI):
+    """
+    Import every module in ROUTE_MODULES and include its router. Safe to call more than once.
+    """
+    if getattr(app.state, "routers_registered", False):
+        return
+    for module_name, prefix, tags in ROUTE_MODULES:
+        module = importlib.import_module(module_name)
+        app.include_router(module.router, prefix=prefix, tags=tags)
+    app.state.routers_registered = True
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """
+    Bind the MongoDB client to the server's event loop for the lifetime of the app
+    and make sure the collection indexes exist before serving requests.
+
+    The default executor is replaced with one sized by THREAD_POOL_SIZE; each
+    worker process has its own loop and so its own pool of that size.
+    """
+    asyncio.get_running_loop().set_default_executor(
+        ThreadPoolExecutor(
+            max_workers=get_settings().thread_pool_size,
+            thread_name_prefix="zance-io",
+        )
+    )
+    start_queue_logging()
+    register_routers(app)
+    await connect_to_mongo()
+    await init_indexes()
+    yield
+    await flush_pending_messages()
+    # Imported here for the same reason as the route modules.
+    from app.services.redis_pubsub import flush_pending_publishes, pubsub_hub
+    from app.services.ai.ai_service import close_openai_client
+
+    await flush_pending_publishes()
+    await pubsub_hub.close()
+    await close_openai_client()
+    await close_mongo_connection()
+    stop_queue_logging()
+
+
+logger = logging.getLogger("main")
+logger.setLevel(logging.INFO)
+
+
+async def unhandled_exception_handler(request: Request, exc: Exception) -> JSONResponse:
+    """
+    Turn any exception a route lets escape into a 500 JSON response.
+
+    HTTPException keeps its own handler; this only sees unexpected errors, so
+    routes don't need their own catch-all try/except.
+    """
+    logger.exception("Unhandled error on %s %s", request.method, request.url.path)
+    return JSONResponse(status_code=500, content={"detail": "Internal server error."})
+
+
+app = FastAPI(title="Zance", lifespan=lifespan)
+app.add_exception_handler(Exception, unhandled_exception_handler)
 
 
 @app.get("/")
-async def root():
+async def root() -> Dict[str, str]:
     return {"message": "Welcome to the Remindria"}
@@ -6,12 +6,28 @@ It includes models for user operations, chat messages, conversations, and AI age
 These models are used for request validation and response serialization.
 """
 
-from pydantic import BaseModel, Field, field_validator
-from typing import Optional, List
-from datetime import datetime
+from pydantic import BaseModel, BeforeValidator, ConfigDict, Field, field_validator
+from typing import Annotated, Optional, List
+from datetime import datetime, timezone
+from functools import partial
+from bson import ObjectId
 import re
 
 
+def _object_id_to_str(value):
+    """
+    Hex-encode an ObjectId read straight from MongoDB; leave strings untouched.
+    """
+    if isinstance(value, ObjectId):
+        return value.binary.hex()
+    return value
+
+
+# A document ID exposed as its 24-character hex string. Repositories can hand
+# raw documents to a response model without converting "_id" themselves.
+ObjectIdStr = Annotated[str, BeforeValidator(_object_id_to_str)]
+
+
 class UserCreate(BaseModel):
     """
     Model for user sign-up requests.
@@ -93,7 +109,7 @@ class UserResponse(BaseModel):
                                           Example: "2024-11-20T18:33:13.953000"
     """
 
-    id: str = Field(
+    id: ObjectIdStr = Field(
         ...,
         alias="_id",
         description="The unique identifier of the user (string representation).",
@@ -108,9 +124,7 @@ class UserResponse(BaseModel):
         None, description="UTC timestamp when the user was created."
     )
 
-    class Config:
-        from_attributes = True
-        populate_by_name = True
+    model_config = ConfigDict(from_attributes=True, populate_by_name=True)
 
 
 # ---------------------------------
@@ -140,12 +154,11 @@ class Message(BaseModel):
         description="The textual content of the message.",
     )
     timestamp: Optional[datetime] = Field(
-        default_factory=lambda: datetime.utcnow(),
+        default_factory=partial(datetime.now, timezone.utc),
         description="The UTC timestamp when the message was created.",
     )
 
-    class Config:
-        from_attributes = True
+    model_config = ConfigDict(from_attributes=True)
 
 
 # ---------------------------------
@@ -190,7 +203,7 @@ class Conversation(BaseModel):
                                         Each message should include at least the fields "role" and "content".
     """
 
-    id: str = Field(
+    id: ObjectIdStr = Field(
         ...,
         alias="_id",
         description="The unique identifier of the conversation (string representation).",
@@ -209,9 +222,7 @@ class Conversation(BaseModel):
         description="List of messages (each as a dictionary) in the conversation history.",
     )
 
-    class Config:
-        from_attributes = True
-        populate_by_field_name = True
+    model_config = ConfigDict(from_attributes=True, populate_by_name=True)
 
 
 # ---------------------------------
@@ -237,7 +248,7 @@ class AI(BaseModel):
                                      Example: "friendly"
     """
 
-    id: str = Field(
+    id: ObjectIdStr = Field(
         ...,
         alias="_id",
         description="The unique identifier of the AI agent (string representation).",
@@ -259,9 +270,7 @@ class AI(BaseModel):
         description="The personality trait of the AI agent.",
     )
 
-    class Config:
-        from_attributes = True
-        populate_by_field_name = True
+    model_config = ConfigDict(from_attributes=True, populate_by_name=True)
 
 
 # ---------------------------------
@@ -4,11 +4,36 @@ AI Repository Module
 Provides functions to interact with the "ais" collection in MongoDB.
 """
 
-from typing import Dict, Any, List, Optional
-from app.database import db
-from bson import ObjectId, errors
+import time
+from cachetools import TTLCache
+from typing import Dict, Any, Iterable, List, Optional, Tuple
+from app.database import get_db
+from app.utils.object_id import parse_object_id, to_object_id
+from bson import ObjectId
+from pymongo import ReturnDocument
 from fastapi import HTTPException, status
 
+# Fields returned when reading AI agents (matches the public AI model).
+AI_PROJECTION = {"name": 1, "age": 1, "details": 1, "personality": 1}
+AI_LIST_BATCH_SIZE = 500
+
+# list_all_ais and get_ai_by_id are served from in-process caches for
+# AI_LIST_CACHE_TTL / AI_CACHE_TTL seconds. Every write in this module bumps
+# _ai_cache_version, which invalidates them, and a result fetched while a write
+# was in flight is never stored.
+AI_LIST_CACHE_TTL = 60.0
+AI_CACHE_TTL = 60.0
+AI_CACHE_SIZE = 1024
+_ai_cache_version = 0
+_ai_list_cache: Optional[Tuple[float, int, List[Dict[str, Any]]]] = None
+_ai_cache: TTLCache = TTLCache(maxsize=AI_CACHE_SIZE, ttl=AI_CACHE_TTL)
+
+
+def _invalidate_ai_caches() -> None:
+    global _ai_cache_version
+    _ai_cache_version += 1
+    _ai_cache.clear()
+
 
 async def create_ai(ai_data: Dict[str, Any]) -> Dict[str, Any]:
     """
@@ -17,7 +42,8 @@ async def create_ai(ai_data: Dict[str, Any]) -> Dict[str, Any]:
     :param ai_data: A dictionary containing AI agent data.
     :return: The inserted AI document with _id as a string.
     """
-    result = await db.ais.insert_one(ai_data)
+    result = await get_db().ais.insert_one(ai_data)
+    _invalidate_ai_caches()
     ai_data["_id"] = str(result.inserted_id)
     return ai_data
 
@@ -26,35 +52,84 @@ async def get_ai_by_id(ai_id: str) -> Optional[Dict[str, Any]]:
     """
     Retrieve an AI agent by its ID.
 
+    Only the AI_PROJECTION fields are read, and found agents are cached
+    in-process for AI_CACHE_TTL seconds.
+
     :param ai_id: The AI agent's ID as a 24-character hex string.
     :return: The AI document if found; otherwise, None.
     :raises HTTPException: If the AI id is invalid.
     """
-    try:
-        oid = ObjectId(ai_id)
-    except errors.InvalidId:
-        raise HTTPException(
-            status_code=status.HTTP_400_BAD_REQUEST,
-            detail=f"Invalid AI id: {ai_id}. It must be a 24-character hex string.",
-        )
-    ai = await db.ais.find_one({"_id": oid})
+    oid = to_object_id(ai_id, "AI")
+    cached = _ai_cache.get(ai_id)
+    if cached is not None:
+        return dict(cached)
+
+    version = _ai_cache_version
+    ai = await get_db().ais.find_one({"_id": oid}, projection=AI_PROJECTION)
     if ai:
         ai["_id"] = str(ai["_id"])
+        if version == _ai_cache_version:
+            _ai_cache[ai_id] = ai
+        return dict(ai)
     return ai
 
 
-async def list_all_ais() -> List[Dict[str, Any]]:
+async def get_ais_by_ids(ai_ids: Iterable[str]) -> Dict[str, Dict[str, Any]]:
     """
-    List all AI agents in the database.
+    Retrieve several AI agents, reading the ones not already cached with a
+    single $in query.
 
-    :return: A list of AI documents with _id converted to strings.
+    IDs that are not valid ObjectId strings cannot match an agent and are skipped.
+
+    :param ai_ids: The AI agent IDs as strings.
+    :return: The found AI documents keyed by their string ID.
     """
-    ais = await db.ais.find().to_list(length=None)
-    for ai in ais:
+    ais: Dict[str, Dict[str, Any]] = {}
+    missing: List[ObjectId] = []
+    for ai_id in set(ai_ids):
+        oid = parse_object_id(ai_id)
+        if oid is None:
+            continue
+        cached = _ai_cache.get(ai_id)
+        if cached is not None:
+            ais[ai_id] = dict(cached)
+        else:
+            missing.append(oid)
+    if not missing:
+        return ais
+
+    version = _ai_cache_version
+    cursor = get_db().ais.find({"_id": {"$in": missing}}, projection=AI_PROJECTION)
+    async for ai in cursor:
         ai["_id"] = str(ai["_id"])
+        if version == _ai_cache_version:
+            _ai_cache[ai["_id"]] = ai
+        ais[ai["_id"]] = dict(ai)
     return ais
 
 
+async def list_all_ais() -> List[Dict[str, Any]]:
+    """
+    List all AI agents in the database.
+
+    Results are cached in-process for AI_LIST_CACHE_TTL seconds; writes made
+    through this module invalidate the cache immediately.
+
+    :return: A list of AI documents; _id is left as an ObjectId for the AI model to encode.
+    """
+    global _ai_list_cache
+    cached = _ai_list_cache
+    if cached and cached[1] == _ai_cache_version and cached[0] > time.monotonic():
+        return list(cached[2])
+
+    version = _ai_cache_version
+    cursor = get_db().ais.find(projection=AI_PROJECTION)
+    ais = await cursor.batch_size(AI_LIST_BATCH_SIZE).to_list(length=None)
+    if version == _ai_cache_version:
+        _ai_list_cache = (time.monotonic() + AI_LIST_CACHE_TTL, version, ais)
+    return list(ais)
+
+
 async def update_ai(ai_id: str, ai_data: Dict[str, Any]) -> Dict[str, Any]:
     """
     Update an existing AI agent.
@@ -64,16 +139,14 @@ async def update_ai(ai_id: str, ai_data: Dict[str, Any]) -> Dict[str, Any]:
     :return: The updated AI document.
     :raises HTTPException: If the AI is not found or the ID is invalid.
     """
-    try:
-        oid = ObjectId(ai_id)
-    except errors.InvalidId:
-        raise HTTPException(
-            status_code=status.HTTP_400_BAD_REQUEST,
-            detail=f"Invalid AI id: {ai_id}. It must be a 24-character hex string.",
-        )
-    result = await db.ais.update_one({"_id": oid}, {"$set": ai_data})
-    if result.modified_count:
-        return await get_ai_by_id(ai_id)
+    oid = to_object_id(ai_id, "AI")
+    ai = await get_db().ais.find_one_and_update(
+        {"_id": oid}, {"$set": ai_data}, return_document=ReturnDocument.AFTER
+    )
+    _invalidate_ai_caches()
+    if ai:
+        ai["_id"] = str(ai["_id"])
+        return ai
     else:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND, detail="AI not found."
@@ -88,14 +161,9 @@ async def delete_ai(ai_id: str) -> Dict[str, Any]:
     :return: A dictionary with a deletion message.
     :raises HTTPException: If the AI is not found or the ID is invalid.
     """
-    try:
-        oid = ObjectId(ai_id)
-    except errors.InvalidId:
-        raise HTTPException(
-            status_code=status.HTTP_400_BAD_REQUEST,
-            detail=f"Invalid AI id: {ai_id}. It must be a 24-character hex string.",
-        )
-    result = await db.ais.delete_one({"_id": oid})
+    oid = to_object_id(ai_id, "AI")
+    result = await get_db().ais.delete_one({"_id": oid})
+    _invalidate_ai_caches()
     if result.deleted_count:
         return {"detail": "AI deleted"}
     else:
@@ -1,7 +1,111 @@
 # app/repositories/chat_repository.py
 
-from app.database import db
-from typing import List
+import asyncio
+from app.database import get_db
+from app.repositories.conversation_repository import (
+    update_conversation_history_record,
+)
+from bson import ObjectId
+from pymongo.errors import BulkWriteError
+from typing import Any, Dict, List, Optional, Tuple
+
+MESSAGES_BATCH_SIZE = 1000
+
+# Fields of the updated conversation returned by save_message_and_append.
+APPEND_RESULT_PROJECTION = {"conversation_type": 1}
+
+# Concurrent save_message calls are coalesced into one insert_many of at most
+# MESSAGE_WRITE_BATCH_SIZE documents, waiting up to MESSAGE_WRITE_WINDOW
+# seconds for the batch to fill.
+MESSAGE_WRITE_BATCH_SIZE = 100
+MESSAGE_WRITE_WINDOW = 0.005
+
+
+class _MessageBatcher:
+    """
+    Buffers message inserts and writes them with unordered insert_many calls.
+
+    Each caller awaits a future that resolves to its document's ObjectId (or
+    raises its write error), so save_message keeps its one-call-one-document
+    semantics.
+    """
+
+    def __init__(self, max_batch_size: int, window: float):
+        self.max_batch_size = max_batch_size
+        self.window = window
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._queue: Optional[asyncio.Queue] = None
+        self._task: Optional[asyncio.Task] = None
+
+    def _ensure_running(self) -> None:
+        loop = asyncio.get_running_loop()
+        if self._loop is not loop or self._task is None or self._task.done():
+            self._loop = loop
+            self._queue = asyncio.Queue()
+            self._task = loop.create_task(self._run())
+
+    async def insert(self, document: dict) -> ObjectId:
+        self._ensure_running()
+        future = self._loop.create_future()
+        self._queue.put_nowait((document, future))
+        return await future
+
+    async def close(self) -> None:
+        """
+        Flush pending documents and stop the background writer.
+        """
+        if self._task is None or self._loop is not asyncio.get_running_loop():
+            return
+        self._queue.put_nowait(None)
+        await self._task
+        self._task = None
+
+    async def _run(self) -> None:
+        while True:
+            item = await self._queue.get()
+            if item is None:
+                return
+            batch: List[Tuple[dict, asyncio.Future]] = [item]
+            if self._queue.qsize() < self.max_batch_size - 1:
+                await asyncio.sleep(self.window)
+            stop = False
+            while len(batch) < self.max_batch_size and not self._queue.empty():
+                item = self._queue.get_nowait()
+                if item is None:
+                    stop = True
+                    break
+                batch.append(item)
+            await self._flush(batch)
+            if stop:
+                return
+
+    async def _flush(self, batch: List[Tuple[dict, asyncio.Future]]) -> None:
+        documents = [document for document, _ in batch]
+        errors = {}
+        try:
+            # insert_many sets "_id" on each document in place.
+            await get_db().messages.insert_many(documents, ordered=False)
+        except BulkWriteError as e:
+            errors = {
+                error["index"]: error for error in e.details.get("writeErrors", [])
+            }
+        except Exception as e:
+            for _, future in batch:
+                if not future.done():
+                    future.set_exception(e)
+            return
+        for index, (document, future) in enumerate(batch):
+            if future.done():
+                continue
+            if index in errors:
+                future.set_exception(
+                    BulkWriteError({"writeErrors": [errors[index]], "nInserted": 0})
+                )
+            else:
+                future.set_result(document["_id"])
+
+
+_message_batcher = _MessageBatcher(MESSAGE_WRITE_BATCH_SIZE, MESSAGE_WRITE_WINDOW)
 
 
 async def save_message(conversation_id: str, message_data: dict) -> dict:
@@ -12,19 +116,52 @@ async def save_message(conversation_id: str, message_data: dict) -> dict:
     """
     # Attach conversation_id to the message document.
     message_data["conversation_id"] = conversation_id
-    result = await db.messages.insert_one(message_data)
-    message_data["_id"] = str(result.inserted_id)
+    inserted_id = await _message_batcher.insert(message_data)
+    message_data["_id"] = str(inserted_id)
     return message_data
 
 
+async def save_message_and_append(
+    conversation_id: str, message_data: dict, history_entry: Dict[str, Any]
+) -> Tuple[dict, Dict[str, Any]]:
+    """
+    Save a chat message and append its history entry to the conversation.
+
+    The messages and conversations collections live in different namespaces,
+    so the two writes are issued concurrently rather than as one bulk_write.
+
+    :param conversation_id: The conversation ID as a 24-character hex string.
+    :param message_data: The message document (sender, content, timestamp).
+    :param history_entry: The entry to push onto the conversation's history.
+    :return: The saved message and the updated conversation document
+             (only the APPEND_RESULT_PROJECTION fields).
+    :raises HTTPException: If the ID is invalid or the conversation is not found.
+    """
+    return await asyncio.gather(
+        save_message(conversation_id, message_data),
+        update_conversation_history_record(
+            conversation_id, [history_entry], projection=APPEND_RESULT_PROJECTION
+        ),
+    )
+
+
+async def flush_pending_messages():
+    """
+    Write any buffered messages and stop the batch writer. Called on application shutdown.
+    """
+    await _message_batcher.close()
+
+
 async def get_conversation_messages(conversation_id: str) -> List[dict]:
     """
     Retrieve all messages for a given conversation_id, sorted by timestamp.
     """
-    cursor = db.messages.find({"conversation_id": conversation_id}).sort("timestamp", 1)
-    messages = []
-    async for document in cursor:
-        # Convert the MongoDB ObjectId to a string.
-        document["_id"] = str(document["_id"])
-        messages.append(document)
-    return messages
+    cursor = (
+        get_db()
+        .messages.find({"conversation_id": conversation_id})
+        .sort("timestamp", 1)
+        .batch_size(MESSAGES_BATCH_SIZE)
+    )
+    documents = await cursor.to_list(length=None)
+    # Convert the MongoDB ObjectId to a string.
+    return [{**document, "_id": str(document["_id"])} for document in documents]
@@ -4,10 +4,14 @@ Conversation repository module.
 Handles direct interactions with the "conversations" collection in MongoDB.
 """
 
-from typing import List, Dict, Any
-from app.database import db
-from bson import ObjectId, errors
+from typing import List, Dict, Any, Optional
+from app.database import get_db
+from app.utils.object_id import to_object_id
+from pymongo import ReturnDocument
 from fastapi import HTTPException, status
+from app.repositories.history_update import capped_history
+
+CONVERSATIONS_BATCH_SIZE = 1000
 
 
 async def create_conversation(conversation_data: Dict[str, Any]) -> Dict[str, Any]:
@@ -17,63 +21,156 @@ async def create_conversation(conversation_data: Dict[str, Any]) -> Dict[str, An
     :param conversation_data: A dictionary containing conversation data.
     :return: The inserted conversation document with the _id converted to a string.
     """
-    result = await db.conversations.insert_one(conversation_data)
+    result = await get_db().conversations.insert_one(conversation_data)
     conversation_data["_id"] = str(result.inserted_id)
     return conversation_data
 
 
-async def get_conversation_by_id(conversation_id: str) -> Dict[str, Any]:
+def _history_window_projection(history_limit: int) -> Dict[str, Any]:
+    # Last history_limit entries, plus the leading system message when it
+    # falls outside them, and the length of the full stored history.
+    history = {"$ifNull": ["$history", []]}
+    tail = {"$slice": [history, -history_limit]}
+    return {
+        "history": {
+            "$cond": [
+                {
+                    "$and": [
+                        {"$gt": [{"$size": history}, history_limit]},
+                        {"$eq": [{"$arrayElemAt": ["$history.role", 0]}, "system"]},
+                    ]
+                },
+                {"$concatArrays": [{"$slice": [history, 1]}, tail]},
+                tail,
+            ]
+        },
+        "history_length": {"$size": history},
+    }
+
+
+async def get_conversation_by_id(
+    conversation_id: str,
+    projection: Optional[Dict[str, Any]] = None,
+    history_limit: Optional[int] = None,
+) -> Dict[str, Any]:
     """
     Retrieve a conversation from the database by its ID.
 
+    With history_limit, only the last history_limit history entries are read
+    (keeping a leading system message), "history_length" holds the length of
+    the full stored history, and only _id plus the fields in projection are
+    returned alongside them.
+
     :param conversation_id: The conversation ID as a 24-character hex string.
+    :param projection: Optional MongoDB projection limiting the returned fields.
+    :param history_limit: Optional maximum number of history entries to read.
     :return: The conversation document if found; otherwise, None.
     """
-    try:
-        oid = ObjectId(conversation_id)
-    except errors.InvalidId:
-        raise HTTPException(
-            status_code=status.HTTP_400_BAD_REQUEST,
-            detail=f"Invalid conversation id: {conversation_id}. It must be a 24-character hex string.",
-        )
-    conversation = await db.conversations.find_one({"_id": oid})
+    oid = to_object_id(conversation_id, "conversation")
+    if history_limit is not None:
+        projection = {**(projection or {}), **_history_window_projection(history_limit)}
+    conversation = await get_db().conversations.find_one(
+        {"_id": oid}, projection=projection
+    )
     if conversation:
         conversation["_id"] = str(conversation["_id"])
     return conversation
 
 
+async def is_participant(conversation_id: str, user_id: str) -> bool:
+    """
+    Check server-side whether a user takes part in a conversation.
+
+    :param conversation_id: The conversation ID as a 24-character hex string.
+    :param user_id: The user ID as a string.
+    :return: True if the conversation exists and lists the user as a participant.
+    :raises HTTPException: If the conversation ID is invalid.
+    """
+    oid = to_object_id(conversation_id, "conversation")
+    count = await get_db().conversations.count_documents(
+        {"_id": oid, "participants": user_id}, limit=1
+    )
+    return count > 0
+
+
 async def list_conversations_for_user(user_id: str) -> List[Dict[str, Any]]:
     """
     List all conversations that include the given user ID in their participants.
 
     :param user_id: The user ID as a string.
-    :return: A list of conversation documents.
+    :return: A list of conversation documents; _id is left as an ObjectId for the
+             Conversation model to encode.
     """
-    cursor = db.conversations.find({"participants": user_id}).sort("created_at", -1)
-    conversations: List[Dict[str, Any]] = []
-    async for doc in cursor:
-        doc["_id"] = str(doc["_id"])
-        conversations.append(doc)
-    return conversations
+    cursor = (
+        get_db()
+        .conversations.find({"participants": user_id})
+        .sort("created_at", -1)
+        .batch_size(CONVERSATIONS_BATCH_SIZE)
+    )
+    return await cursor.to_list(length=None)
 
 
 async def update_conversation_history_record(
-    conversation_id: str, history: List[Dict[str, Any]], interrupted: bool = False
+    conversation_id: str,
+    new_messages: List[Dict[str, Any]],
+    interrupted: Optional[bool] = False,
+    prepend_messages: Optional[List[Dict[str, Any]]] = None,
+    projection: Optional[Dict[str, Any]] = None,
+    system_message: Optional[Dict[str, Any]] = None,
 ) -> Dict[str, Any]:
-    try:
-        oid = ObjectId(conversation_id)
-    except errors.InvalidId:
-        raise HTTPException(
-            status_code=status.HTTP_400_BAD_REQUEST,
-            detail=f"Invalid conversation id: {conversation_id}. Must be 24-char hex.",
+    """
+    Append messages to a conversation's history and set its interrupted flag.
+
+    Only the new messages are sent to MongoDB; the history is capped at
+    HISTORY_MAX_LENGTH entries, dropping the oldest ones after a leading
+    system message (see capped_history).
+
+    :param conversation_id: The conversation ID as a 24-character hex string.
+    :param new_messages: The messages to append (may be empty to only update the flag).
+    :param interrupted: The new value of the conversation's interrupted flag,
+                        or None to leave it as it is.
+    :param prepend_messages: Optional messages to insert at the front of the history
+                             in the same update (e.g. a missing system message).
+                             Skipped if the stored history already starts with
+                             a message of the same role, so concurrent callers
+                             don't each insert one.
+    :param projection: Optional projection for the returned document, for callers
+                       that don't need the whole history back.
+    :param system_message: Optional system message that replaces a leading system
+                           message, or is inserted in front of the history
+                           otherwise, in the same update.
+    :return: The updated conversation document.
+    :raises HTTPException: If the ID is invalid or the conversation is not found.
+    """
+    fields: Dict[str, Any] = {}
+    if interrupted is not None:
+        fields["interrupted"] = interrupted
+    if new_messages or prepend_messages or system_message:
+        # A plain $push with $slice would trim history[0] like any other entry,
+        # and two $push operators can't target one field, so the new array is
+        # built server-side.
+        fields["history"] = capped_history(
+            new_messages, prepend_messages, system_message
         )
+        update: Any = [{"$set": fields}]
+    else:
+        update = {"$set": fields}
+    return await _find_and_update_conversation(conversation_id, update, projection)
 
-    # Prepare the fields you want to update.
-    fields_to_update = {"history": history, "interrupted": interrupted}
 
-    result = await db.conversations.update_one({"_id": oid}, {"$set": fields_to_update})
-    if result.modified_count:
-        updated_conversation = await get_conversation_by_id(conversation_id)
+async def _find_and_update_conversation(
+    conversation_id: str, update: Any, projection: Optional[Dict[str, Any]] = None
+) -> Dict[str, Any]:
+    oid = to_object_id(conversation_id, "conversation")
+
+    updated_conversation = await get_db().conversations.find_one_and_update(
+        {"_id": oid},
+        update,
+        projection=projection,
+        return_document=ReturnDocument.AFTER,
+    )
+    if updated_conversation:
+        updated_conversation["_id"] = str(updated_conversation["_id"])
         return updated_conversation
     else:
         raise HTTPException(
@@ -0,0 +1,87 @@
+"""
+History update module.
+
+Builds the update pipelines that append to a conversation's capped history.
+It only depends on plain dicts, so both the async repositories and the
+synchronous Celery helpers (app/sync_mongo.py) can use it.
+"""
+
+from typing import Any, Dict, List, Optional
+
+# Appending to a conversation keeps only its most recent HISTORY_MAX_LENGTH
+# entries. A leading system message always stays at history[0] and counts
+# towards the cap.
+HISTORY_MAX_LENGTH = 500
+
+_HISTORY = {"$ifNull": ["$history", []]}
+_HEAD_ROLE = {"$arrayElemAt": ["$history.role", 0]}
+# Everything after history[0]; only evaluated when the history is non-empty,
+# and n is kept positive because $slice rejects a count of 0.
+_AFTER_HEAD = {"$slice": [_HISTORY, 1, {"$max": [{"$size": _HISTORY}, 1]}]}
+
+
+def _capped(head: Any, rest: Any, new_messages: List[Dict[str, Any]], keep: int):
+    # head + the last `keep` entries of rest + new_messages; $literal keeps
+    # "$..." message content from being read as field paths.
+    tail = {"$slice": [{"$concatArrays": [rest, {"$literal": new_messages}]}, -keep]}
+    return {"$concatArrays": [head, tail]}
+
+
+def capped_history(
+    new_messages: List[Dict[str, Any]],
+    prepend_messages: Optional[List[Dict[str, Any]]] = None,
+    system_message: Optional[Dict[str, Any]] = None,
+) -> Dict[str, Any]:
+    """
+    Build the expression for the new value of "history" in a pipeline update.
+
+    The new messages are appended and the oldest entries after the head are
+    dropped to stay within HISTORY_MAX_LENGTH, so a leading system message is
+    never trimmed away.
+
+    :param new_messages: The messages to append.
+    :param prepend_messages: Optional messages to insert at the front, skipped
+                             if the stored history already starts with a
+                             message of the same role. Only the entries after
+                             them are trimmed.
+    :param system_message: Optional system message that replaces a leading
+                           system message, or is inserted in front otherwise.
+    :return: An aggregation expression for use in a "$set" pipeline stage.
+    """
+    head_is_system = {"$eq": [_HEAD_ROLE, "system"]}
+    if system_message is not None:
+        return _capped(
+            {"$literal": [system_message]},
+            {"$cond": [head_is_system, _AFTER_HEAD, _HISTORY]},
+            new_messages,
+            HISTORY_MAX_LENGTH - 1,
+        )
+
+    appended = {
+        "$cond": [
+            head_is_system,
+            _capped(
+                {"$slice": [_HISTORY, 1]},
+                _AFTER_HEAD,
+                new_messages,
+                HISTORY_MAX_LENGTH - 1,
+            ),
+            _capped([], _HISTORY, new_messages, HISTORY_MAX_LENGTH),
+        ]
+    }
+    if not prepend_messages:
+        return appended
+
+    prepended = _capped(
+        {"$literal": prepend_messages},
+        _HISTORY,
+        new_messages,
+        HISTORY_MAX_LENGTH - len(prepend_messages),
+    )
+    return {
+        "$cond": [
+            {"$eq": [_HEAD_ROLE, prepend_messages[0].get("role")]},
+            appended,
+            prepended,
+        ]
+    }
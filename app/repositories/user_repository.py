@@ -4,20 +4,24 @@ User Repository Module
 Provides functions for querying and updating the "users" collection in MongoDB.
 """
 
-from typing import Optional, List, Dict, Any
-from app.database import db
-from bson import ObjectId, errors
-from fastapi import HTTPException, status
+from typing import AsyncIterator, Iterable, Optional, Dict, Any
+from app.database import get_db
+from app.utils.object_id import parse_object_id, to_object_id
 
+USERS_BATCH_SIZE = 500
 
-async def get_user_by_username(username: str) -> Optional[Dict[str, Any]]:
+
+async def get_user_by_username(
+    username: str, projection: Optional[Dict[str, Any]] = None
+) -> Optional[Dict[str, Any]]:
     """
     Retrieve a user document by username.
 
     :param username: The username to search for.
+    :param projection: Optional projection limiting the returned fields.
     :return: The user document if found, otherwise None.
     """
-    return await db.users.find_one({"username": username})
+    return await get_db().users.find_one({"username": username}, projection)
 
 
 async def get_user_by_phone_number(phone_number: str) -> Optional[Dict[str, Any]]:
@@ -27,7 +31,7 @@ async def get_user_by_phone_number(phone_number: str) -> Optional[Dict[str, Any]
     :param phone_number: The phone number to search for (e.g., "+2348123456782").
     :return: The user document if found, otherwise None.
     """
-    return await db.users.find_one({"phone_number": phone_number})
+    return await get_db().users.find_one({"phone_number": phone_number})
 
 
 async def get_user_by_id(user_id: str) -> Optional[Dict[str, Any]]:
@@ -39,19 +43,40 @@ async def get_user_by_id(user_id: str) -> Optional[Dict[str, Any]]:
     :return: The user document if found, otherwise None.
     :raises HTTPException: If the user_id is not a valid 24-character hex string.
     """
-    try:
-        oid = ObjectId(user_id)
-    except errors.InvalidId:
-        raise HTTPException(
-            status_code=status.HTTP_400_BAD_REQUEST,
-            detail=f"Invalid user id: {user_id}. It must be a 24-character hex string.",
-        )
-    user = await db.users.find_one({"_id": oid})
+    oid = to_object_id(user_id, "user")
+    user = await get_db().users.find_one({"_id": oid})
     if user:
         user["_id"] = str(user["_id"])
     return user
 
 
+async def get_users_by_ids(
+    user_ids: Iterable[str], projection: Optional[Dict[str, Any]] = None
+) -> Dict[str, Dict[str, Any]]:
+    """
+    Retrieve several users with a single $in query.
+
+    IDs that are not valid ObjectId strings cannot match a user and are skipped.
+
+    :param user_ids: The user IDs as strings.
+    :param projection: Optional projection limiting the returned fields.
+    :return: The found user documents keyed by their string ID.
+    """
+    oids = [
+        oid
+        for oid in (parse_object_id(user_id) for user_id in set(user_ids))
+        if oid is not None
+    ]
+    if not oids:
+        return {}
+    users: Dict[str, Dict[str, Any]] = {}
+    cursor = get_db().users.find({"_id": {"$in": oids}}, projection=projection)
+    async for user in cursor:
+        user["_id"] = str(user["_id"])
+        users[user["_id"]] = user
+    return users
+
+
 async def create_user(user_data: Dict[str, Any]) -> Dict[str, Any]:
     """
     Insert a new user document into the database.
@@ -59,19 +84,30 @@ async def create_user(user_data: Dict[str, Any]) -> Dict[str, Any]:
     :param user_data: A dictionary containing user data.
     :return: The created user document with the _id converted to a string.
     """
-    result = await db.users.insert_one(user_data)
+    result = await get_db().users.insert_one(user_data)
     user_data["_id"] = str(result.inserted_id)
     return user_data
 
 
-async def get_all_users() -> List[Dict[str, Any]]:
+async def iter_all_users(
+    skip: int = 0, limit: Optional[int] = None
+) -> AsyncIterator[Dict[str, Any]]:
     """
-    Retrieve all user documents from the database,
+    Stream user documents from the database in _id order,
     converting each document's _id to a string.
 
-    :return: A list of user documents.
+    Documents are fetched USERS_BATCH_SIZE at a time, so only one batch is
+    held in memory.
+
+    :param skip: Number of users to skip.
+    :param limit: Maximum number of users to yield (None yields all remaining users).
+    :return: An async iterator of user documents.
     """
-    users = await db.users.find().to_list(length=None)
-    for user in users:
+    cursor = (
+        get_db().users.find().sort("_id", 1).skip(skip).batch_size(USERS_BATCH_SIZE)
+    )
+    if limit is not None:
+        cursor = cursor.limit(limit)
+    async for user in cursor:
         user["_id"] = str(user["_id"])
-    return users
+        yield user
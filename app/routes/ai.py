@@ -26,13 +26,7 @@ async def create_ai_endpoint(ai: AI) -> Dict[str, Any]:
     :param ai: An AI model instance.
     :return: The created AI agent document.
     """
-    try:
-        return await create_ai(ai.model_dump())
-    except Exception as e:
-        raise HTTPException(
-            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
-            detail=f"Failed to create AI agent: {e}",
-        )
+    return await create_ai(ai.model_dump())
 
 
 @router.get("/{ai_id}", response_model=AI)
@@ -58,13 +52,7 @@ async def list_ais_endpoint() -> List[Dict[str, Any]]:
 
     :return: A list of AI agent documents.
     """
-    try:
-        return await list_all_ais()
-    except Exception as e:
-        raise HTTPException(
-            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
-            detail=f"Failed to list AI agents: {e}",
-        )
+    return await list_all_ais()
 
 
 @router.put("/{ai_id}", response_model=AI)
@@ -76,13 +64,7 @@ async def update_ai_endpoint(ai_id: str, ai: AI) -> Dict[str, Any]:
     :param ai: An AI model instance with new data.
     :return: The updated AI agent document.
     """
-    try:
-        return await update_ai(ai_id, ai.model_dump(exclude_unset=True))
-    except Exception as e:
-        raise HTTPException(
-            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
-            detail=f"Failed to update AI agent: {e}",
-        )
+    return await update_ai(ai_id, ai.model_dump(exclude_unset=True))
 
 
 @router.delete("/{ai_id}")
@@ -93,10 +75,4 @@ async def delete_ai_endpoint(ai_id: str) -> Dict[str, Any]:
     :param ai_id: The ID of the AI agent to delete.
     :return: A dictionary confirming deletion.
     """
-    try:
-        return await delete_ai(ai_id)
-    except Exception as e:
-        raise HTTPException(
-            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
-            detail=f"Failed to delete AI agent: {e}",
-        )
+    return await delete_ai(ai_id)
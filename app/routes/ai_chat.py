@@ -1,10 +1,11 @@
 # app/routes/ai_chat.py
 
+import asyncio
 from fastapi import APIRouter, HTTPException, status, Depends
 from fastapi.security import OAuth2PasswordBearer
 from pydantic import BaseModel, Field
 from typing import List, Optional
-from datetime import datetime
+from datetime import datetime, timezone
 from app.repositories.ai_repository import get_ai_by_id
 from app.services.ai.ai_service import get_ai_response, master_ai
 from app.services.ai.ai_chunking_service import chunk_messages
@@ -24,7 +25,11 @@ router = APIRouter()
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="/users/login")
 
 logger = logging.getLogger(__name__)
-logger.setLevel(logging.DEBUG)
+logger.setLevel(logging.INFO)
+
+# Most recent history entries sent to the models as context (a leading system
+# message is always kept on top of these).
+AI_CHAT_HISTORY_LIMIT = 50
 
 
 class AIChatRequest(BaseModel):
@@ -66,16 +71,23 @@ async def chat_with_ai(
                 status_code=status.HTTP_401_UNAUTHORIZED,
                 detail="Invalid token: no user id found.",
             )
-
-        user_data = await get_user({"id": user_id})
-        print(user_data)
     except Exception:
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED, detail="Invalid or expired token."
         )
 
-    # 2. Retrieve AI details
-    ai_details = await get_ai_by_id(ai_id)
+    # 2. Load the user and the AI details concurrently. A user lookup failure
+    # still takes precedence (401) over AI errors.
+    user_data, ai_details = await asyncio.gather(
+        get_user({"id": user_id}), get_ai_by_id(ai_id), return_exceptions=True
+    )
+    if isinstance(user_data, BaseException):
+        raise HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED, detail="Invalid or expired token."
+        )
+    logger.debug("user_data=%r", user_data)
+    if isinstance(ai_details, BaseException):
+        raise ai_details
     if not ai_details:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND, detail="AI not found."
@@ -83,25 +95,26 @@ async def chat_with_ai(
 
     # 3. Prepare or retrieve conversation
     if request.chat_id:
-        conversation = await get_conversation(request.chat_id)
+        conversation = await get_conversation(
+            request.chat_id, history_limit=AI_CHAT_HISTORY_LIMIT
+        )
         if not conversation:
             raise HTTPException(
                 status_code=status.HTTP_404_NOT_FOUND, detail="Conversation not found."
             )
         chat_id = conversation.get("id") or conversation.get("_id")
         conversation_history = conversation.get("history", [])
+        stored_history_length = conversation.get("history_length", 0)
 
         # If there's an ongoing chunk delivery, mark it interrupted
         conversation["interrupted"] = True
-        await update_conversation_history_record(
-            chat_id, conversation_history, interrupted=True
-        )
+        await update_conversation_history_record(chat_id, [], interrupted=True)
     else:
         # Create new conversation doc
         conversation_data = {
             "participants": [user_id, ai_details.get("id") or ai_details.get("_id")],
             "conversation_type": "ai",
-            "created_at": datetime.utcnow(),
+            "created_at": datetime.now(timezone.utc),
             "history": [],
         }
         conversation = await create_new_conversation(
@@ -109,6 +122,7 @@ async def chat_with_ai(
         )
         chat_id = conversation.get("id") or conversation.get("_id")
         conversation_history = []
+        stored_history_length = 0
 
     # 4. Ensure system message is present
     logger.info("Ensuring system message is present")
@@ -116,11 +130,17 @@ async def chat_with_ai(
         f"You are {ai_details.get('name', 'an AI')} with personality "
         f"{ai_details.get('personality', 'friendly')}. {ai_details.get('details', '')}"
     )
-    if not any(msg.get("role") == "system" for msg in conversation_history):
-        conversation_history.insert(0, {"role": "system", "content": system_message})
+    # The system message is only ever stored at the head of the history.
+    needs_system_message = (
+        not conversation_history or conversation_history[0].get("role") != "system"
+    )
+    system_entry = {"role": "system", "content": system_message}
+    if needs_system_message:
+        conversation_history.insert(0, system_entry)
 
     # 5. Append user's message
-    conversation_history.append({"role": "user", "content": request.message})
+    user_message = {"role": "user", "content": request.message}
+    conversation_history.append(user_message)
 
     logger.info("Getting master AI's decision")
     # 6. Get the master AI's decision
@@ -128,7 +148,7 @@ async def chat_with_ai(
         master_ai_response = await master_ai(
             request.message, user_data, ai_details, conversation_history
         )
-        print(master_ai_response)
+        logger.debug("master_ai_response=%r", master_ai_response)
     except Exception as e:
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail=str(e)
@@ -143,7 +163,7 @@ async def chat_with_ai(
             request.message,
             master_ai_response,
         )
-        print("Scheduling plan:", chunks)
+        logger.debug("Scheduling plan: %r", chunks)
     except Exception as e:
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
@@ -151,14 +171,24 @@ async def chat_with_ai(
         )
 
     # 8. Update the conversation record so it's not interrupted
-    updated_conversation = await update_conversation_history_record(
-        chat_id, conversation_history, interrupted=False
-    )
+    if needs_system_message and stored_history_length:
+        # The system message goes in front of the stored history (of which only
+        # a window was read), so insert it server-side.
+        updated_conversation = await update_conversation_history_record(
+            chat_id, [user_message], interrupted=False, prepend_messages=[system_entry]
+        )
+    else:
+        # Only push what this request added.
+        new_messages = conversation_history if needs_system_message else [user_message]
+        updated_conversation = await update_conversation_history_record(
+            chat_id, new_messages, interrupted=False
+        )
 
     # 9. Dispatch the Celery task with the scheduling plan
     # We pass the conversation ID and the scheduling plan so the worker can fetch
-    # conversation data from DB (or we could pass them directly)
-    deliver_chunks_task.delay(chat_id, chunks)
+    # conversation data from DB (or we could pass them directly).
+    # .delay is a blocking broker publish, so it runs in a worker thread.
+    await asyncio.to_thread(deliver_chunks_task.delay, chat_id, chunks)
 
     # 10. Return an immediate response so the user sees something now
     return AIChatResponse(
@@ -1,31 +1,229 @@
 # app/routes/chat.py
 
 from fastapi import APIRouter, WebSocket, WebSocketDisconnect
-from app.services.chat_service import send_message, fetch_conversation_history
+from app.services.chat_service import (
+    send_message_and_append,
+    fetch_conversation_history,
+)
 from app.models import Message
-from typing import List, Dict
+from pydantic import ValidationError
+from typing import Any, List, Dict, Set, Tuple, Union
 import asyncio
-import json
+import logging
+
+try:
+    from compression import zstd
+except ImportError:
+    from backports import zstd
 
 # For JWT decoding and conversation authorization.
 from app.utils.auth import decode_access_token
-from app.services.conversation_service import (
-    get_conversation,
-    update_conversation_history_record,
-)
+from app.services.conversation_service import is_conversation_participant
 
 # For Redis Pub/Sub.
-from app.services.redis_pubsub import publish_message, subscribe_to_channel
+from app.services.redis_pubsub import publish_message, pubsub_hub
+from app.services.ai.ai_group_service import automate_group_ai_response
 
 router = APIRouter()
 
+logger = logging.getLogger("chat")
+logger.setLevel(logging.INFO)
+
 # In-memory store for local WebSocket connections per conversation.
 # (This is only for local instance routing; message distribution is handled by Redis.)
-local_connections: Dict[str, List[WebSocket]] = {}
+local_connections: Dict[str, Set[WebSocket]] = {}
+
+# Clients that offer the ZSTD_SUBPROTOCOL subprotocol get broadcasts of at
+# least ZSTD_MIN_SIZE bytes as zstd-compressed binary frames; everything else
+# is sent as plain text. Each payload is compressed once per broadcast.
+ZSTD_SUBPROTOCOL = "zance.zstd"
+ZSTD_MIN_SIZE = 512
+ZSTD_LEVEL = 3
+zstd_connections: Set[WebSocket] = set()
+
+# Broadcast tuning: messages waiting for delivery per listener, how many queued
+# messages one broadcast may carry, and how many clients are sent to before
+# yielding back to the event loop.
+BROADCAST_QUEUE_SIZE = 1024
+BROADCAST_COALESCE_LIMIT = 64
+BROADCAST_BATCH_SIZE = 50
+
+# At most MAX_CONCURRENT_SENDS client sends run at once across all broadcasts,
+# and a client that takes longer than SEND_TIMEOUT seconds is dropped.
+MAX_CONCURRENT_SENDS = 100
+SEND_TIMEOUT = 5.0
+_send_semaphore = asyncio.Semaphore(MAX_CONCURRENT_SENDS)
+
+# Per conversation with local connections: the queue the process-wide pub/sub
+# hub feeds, the task broadcasting from it, and the number of connections using them.
+conversation_listeners: Dict[str, Tuple[asyncio.Queue, asyncio.Task, int]] = {}
+
+# Group conversations with an automated AI reply in flight on this instance,
+# and those that received another user message while it was running. The
+# reply tasks themselves are held until they finish so they are not
+# garbage-collected mid-run.
+_pending_group_replies: Set[str] = set()
+_rerun_group_replies: Set[str] = set()
+_group_reply_tasks: Set[asyncio.Task] = set()
+
+
+def _remove_connection(conversation_id: str, websocket: WebSocket):
+    """
+    Forget a local WebSocket connection (no-op if it is already gone).
+    """
+    zstd_connections.discard(websocket)
+    conns = local_connections.get(conversation_id)
+    if conns is not None:
+        conns.discard(websocket)
+        if not conns:
+            del local_connections[conversation_id]
+
+
+def compress_frame(payload: str) -> Union[str, bytes]:
+    """
+    Return the zstd-compressed payload, or the payload itself if it is too small to bother.
+    """
+    raw = payload.encode()
+    if len(raw) < ZSTD_MIN_SIZE:
+        return payload
+    return zstd.compress(raw, level=ZSTD_LEVEL)
+
+
+async def _send_all(websocket: WebSocket, payloads: List[Union[str, bytes]]):
+    for payload in payloads:
+        if isinstance(payload, bytes):
+            await websocket.send_bytes(payload)
+        else:
+            await websocket.send_text(payload)
+
+
+async def safe_send(websocket: WebSocket, payloads: List[Union[str, bytes]]) -> bool:
+    """
+    Send payloads to one client, bounded by the shared semaphore and SEND_TIMEOUT.
+
+    :return: True if every payload was sent, False if the client failed or timed out.
+    """
+    async with _send_semaphore:
+        try:
+            await asyncio.wait_for(_send_all(websocket, payloads), SEND_TIMEOUT)
+            return True
+        except Exception:
+            return False
+
+
+async def broadcast_batch(conversation_id: str, payloads: List[str]):
+    """
+    Send pre-encoded messages, in order, to every local connection of a conversation.
+
+    Clients are served BROADCAST_BATCH_SIZE at a time, concurrently within a
+    chunk, yielding to the event loop between chunks. Each message is still
+    its own frame; zstd clients share one compressed copy of each payload.
+    Connections whose send fails or times out are dropped.
+    """
+    conns = list(local_connections.get(conversation_id, []))
+    compressed = None
+    if any(conn in zstd_connections for conn in conns):
+        compressed = [compress_frame(payload) for payload in payloads]
+    for start in range(0, len(conns), BROADCAST_BATCH_SIZE):
+        chunk = conns[start : start + BROADCAST_BATCH_SIZE]
+        results = await asyncio.gather(
+            *(
+                safe_send(conn, compressed if conn in zstd_connections else payloads)
+                for conn in chunk
+            )
+        )
+        for conn, sent in zip(chunk, results):
+            if not sent:
+                _remove_connection(conversation_id, conn)
+        await asyncio.sleep(0)
+
+
+async def broadcaster(conversation_id: str, queue: asyncio.Queue):
+    """
+    Relay a conversation's Redis messages to its local WebSocket connections.
+
+    Messages are published as JSON, so the hub queues the raw payloads as-is
+    instead of decoding and re-encoding them; this drains whatever has piled
+    up and broadcasts it as one batch.
+    """
+    while True:
+        payloads = [await queue.get()]
+        while len(payloads) < BROADCAST_COALESCE_LIMIT and not queue.empty():
+            payloads.append(queue.get_nowait())
+        await broadcast_batch(conversation_id, payloads)
+
+
+async def _acquire_listener(conversation_id: str):
+    """
+    Register a local connection with the conversation's broadcaster, starting
+    it and subscribing its queue to the hub for the first connection
+    (or restarting it, if it died).
+    """
+    entry = conversation_listeners.get(conversation_id)
+    if entry is None:
+        queue: asyncio.Queue = asyncio.Queue(maxsize=BROADCAST_QUEUE_SIZE)
+        task = asyncio.create_task(broadcaster(conversation_id, queue))
+        # Registered before subscribing so concurrent connections share it.
+        conversation_listeners[conversation_id] = (queue, task, 1)
+        await pubsub_hub.subscribe(conversation_id, queue)
+        return
+    queue, task, count = entry
+    if task.done():
+        task = asyncio.create_task(broadcaster(conversation_id, queue))
+    conversation_listeners[conversation_id] = (queue, task, count + 1)
+
+
+async def _release_listener(conversation_id: str):
+    """
+    Unregister a local connection; when none are left the queue is
+    unsubscribed and the broadcaster is cancelled and awaited, so it never
+    outlives the conversation's last connection.
+    """
+    entry = conversation_listeners.get(conversation_id)
+    if entry is None:
+        return
+    queue, task, count = entry
+    if count <= 1:
+        del conversation_listeners[conversation_id]
+        task.cancel()
+        await pubsub_hub.unsubscribe(conversation_id, queue)
+        await asyncio.gather(task, return_exceptions=True)
+    else:
+        conversation_listeners[conversation_id] = (queue, task, count - 1)
+
+
+def _schedule_group_reply(conversation_id: str):
+    """
+    Start an automated AI reply for a group conversation.
+
+    While a reply is running, further triggers are coalesced into one more
+    reply started when it finishes, so the latest message is still answered.
+    """
+    if conversation_id in _pending_group_replies:
+        _rerun_group_replies.add(conversation_id)
+        return
+    _pending_group_replies.add(conversation_id)
+    task = asyncio.create_task(automate_group_ai_response(conversation_id))
+    _group_reply_tasks.add(task)
+    task.add_done_callback(lambda t: _group_reply_done(conversation_id, t))
+
+
+def _group_reply_done(conversation_id: str, task: asyncio.Task):
+    _group_reply_tasks.discard(task)
+    _pending_group_replies.discard(conversation_id)
+    if not task.cancelled() and task.exception() is not None:
+        logger.error(
+            "Automated group reply failed for %s: %s",
+            conversation_id,
+            task.exception(),
+        )
+    if conversation_id in _rerun_group_replies:
+        _rerun_group_replies.discard(conversation_id)
+        _schedule_group_reply(conversation_id)
 
 
 @router.get("/conversation/{conversation_id}")
-async def get_conversation_endpoint(conversation_id: str):
+async def get_conversation_endpoint(conversation_id: str) -> Dict[str, Any]:
     messages = await fetch_conversation_history(conversation_id)
     return {"conversation_id": conversation_id, "messages": messages}
 
@@ -34,7 +232,9 @@ async def get_conversation_endpoint(conversation_id: str):
 async def websocket_endpoint(websocket: WebSocket, conversation_id: str):
     """
     Secure WebSocket endpoint using JWT authentication & Redis Pub/Sub for distributed messaging.
-    Clients must provide their token as a query parameter (e.g., ?token=YOUR_JWT).
+    Clients must provide their token as a query parameter (e.g., ?token=YOUR_JWT),
+    and may offer the "zance.zstd" subprotocol to receive large broadcasts as
+    zstd-compressed binary frames.
     """
     # Extract token from query parameters.
     token = websocket.query_params.get("token")
@@ -52,119 +252,75 @@ async def websocket_endpoint(websocket: WebSocket, conversation_id: str):
             await websocket.close(code=1008)
             return
     except Exception as e:
-        print("Error decoding token:", e)
+        logger.info("Error decoding token: %s", e)
         await websocket.close(code=1008)
         return
 
     # Authorization: check if user is a participant in the conversation.
     try:
-        conversation = await get_conversation(conversation_id)
-        print("Conversation data:", conversation)
-        if not conversation:
-            print("Conversation not found.")
-            await websocket.close(code=1008)
-            return
+        authorized = await is_conversation_participant(conversation_id, user_id)
     except Exception as e:
-        print("Error fetching conversation:", e)
+        logger.info("Error fetching conversation %s: %s", conversation_id, e)
         await websocket.close(code=1008)
         return
 
-    if user_id not in conversation.get("participants", []):
-        print("User not authorized for conversation.")
+    if not authorized:
+        logger.info(
+            "User %s not authorized for conversation %s (or it does not exist).",
+            user_id,
+            conversation_id,
+        )
         await websocket.close(code=1008)
         return
 
-    # Accept the WebSocket connection.
-    await websocket.accept()
+    # Accept the WebSocket connection, opting into compression if offered.
+    if ZSTD_SUBPROTOCOL in websocket.scope.get("subprotocols", []):
+        await websocket.accept(subprotocol=ZSTD_SUBPROTOCOL)
+        zstd_connections.add(websocket)
+    else:
+        await websocket.accept()
 
     # Add this websocket connection to the local store.
-    if conversation_id not in local_connections:
-        local_connections[conversation_id] = []
-    local_connections[conversation_id].append(websocket)
+    local_connections.setdefault(conversation_id, set()).add(websocket)
 
     # -- User Presence: Mark the user as online for this conversation --
 
-    # Start a background task to subscribe to the Redis channel for this conversation.
-    async def redis_listener():
-        async for message in subscribe_to_channel(conversation_id):
-            # Broadcast received message to local WebSocket connections.
-            for conn in local_connections.get(conversation_id, []):
-                try:
-                    await conn.send_text(json.dumps(message))
-                except Exception:
-                    continue
-
-    listener_task = asyncio.create_task(redis_listener())
-
     try:
+        # Share this instance's Redis subscription for the conversation.
+        await _acquire_listener(conversation_id)
+
         # Main WebSocket receive loop.
         while True:
             data = await websocket.receive_text()
             try:
-                message_data = json.loads(data)
-            except Exception:
-                await websocket.send_text("Invalid message format. Please send JSON.")
-                continue
-
-            try:
-                # Create a Message instance (automatically adds timestamp).
-                message_obj = Message(**message_data)
-            except Exception as e:
-                await websocket.send_text(f"Error in message data: {e}")
+                # Parse and validate in one pass (automatically adds timestamp).
+                message_obj = Message.model_validate_json(data)
+            except ValidationError as e:
+                if e.errors()[0]["type"] == "json_invalid":
+                    await websocket.send_text(
+                        "Invalid message format. Please send JSON."
+                    )
+                else:
+                    await websocket.send_text(f"Error in message data: {e}")
                 continue
 
-            # Save the message in the database.
-            saved_message = await send_message(conversation_id, message_obj)
-
-            # Ensure the message is also added to the conversation history
-            conversation = await get_conversation(conversation_id)
-            if conversation:
-                history = conversation.get("history", [])
-                history.append(
-                    {
-                        "role": "user",
-                        "sender": message_obj.sender,
-                        "content": message_obj.content,
-                    }
-                )
-                # Append user message
-                await update_conversation_history_record(
-                    conversation_id, history
-                )  # Update DB
+            # Save the message and append it to the conversation history.
+            saved_message, conversation = await send_message_and_append(
+                conversation_id, message_obj
+            )
 
             # Publish the saved message to the Redis channel for distributed broadcasting.
             await publish_message(conversation_id, saved_message)
 
-            # Trigger AI response after message is saved
+            # For group chats, a message from a user triggers an automated AI response.
             if conversation.get("conversation_type") == "group":
                 if message_obj.sender:  # Ensures sender is a user
-                    from app.services.ai.ai_group_service import (
-                        automate_group_ai_response,
-                    )
-
-                    asyncio.create_task(automate_group_ai_response(conversation_id))
-
-            # For group chats, if the conversation type is "group" and the message is from a user,
-            # trigger an automated AI response.
-
-            conv = await get_conversation(conversation_id)
-            if conv.get("conversation_type") == "group":
-                if message_obj.sender:  # Ensure AI does not respond to itself
-                    from app.services.ai.ai_group_service import (
-                        automate_group_ai_response,
-                    )
-
-                    # Prevent duplicate AI responses
-                    if not any(
-                        msg.get("role") == "assistant"
-                        for msg in conversation.get("history", [])
-                    ):
-                        asyncio.create_task(automate_group_ai_response(conversation_id))
+                    _schedule_group_reply(conversation_id)
 
     except WebSocketDisconnect:
-        # Remove the WebSocket from local connections on disconnect.
-        if conversation_id in local_connections:
-            local_connections[conversation_id].remove(websocket)
         # Optionally update presence here (e.g., remove from Redis set).
+        pass
     finally:
-        listener_task.cancel()
+        # Remove the WebSocket from local connections however the loop ended.
+        _remove_connection(conversation_id, websocket)
+        await _release_listener(conversation_id)
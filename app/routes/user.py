@@ -4,14 +4,17 @@ User Routes Module
 Defines endpoints for user signup, login, and retrieval.
 """
 
-from fastapi import APIRouter, HTTPException, status
+from fastapi import APIRouter, HTTPException, Query, status
+from fastapi.responses import StreamingResponse
+from typing import Any, AsyncIterator, Dict, Optional
 from app.models import UserCreate, UserResponse
 from app.services.user_service import (
     register_user,
     authenticate_user,
-    get_users as get_all_users_service,
+    stream_users,
 )
 from pydantic import BaseModel
+from pydantic_core import to_json
 
 router = APIRouter()
 
@@ -44,7 +47,7 @@ class UserLogin(BaseModel):
 
 
 @router.post("/login")
-async def login(user: UserLogin):
+async def login(user: UserLogin) -> Dict[str, Any]:
     """
     Authenticate a user and return a JWT token.
 
@@ -64,19 +67,40 @@ async def login(user: UserLogin):
 
 
 @router.get("/all")
-async def get_all_users_endpoint():
+async def get_all_users_endpoint(
+    skip: int = Query(0, ge=0), limit: Optional[int] = Query(None, ge=1)
+) -> StreamingResponse:
     """
-    Retrieve all users.
+    Retrieve all users, optionally one page at a time.
 
-    :return: A list of user documents.
+    The users are streamed as a JSON array while they are read from MongoDB.
+    The first document is fetched before the response starts, so a database
+    failure still surfaces as a 500.
+
+    :param skip: Number of users to skip.
+    :param limit: Maximum number of users to return (omit for all).
+    :return: A streamed JSON array of user documents.
     """
+    users = stream_users(skip, limit)
     try:
-        users = await get_all_users_service()
-        return users
-    except HTTPException as he:
-        raise he
+        first_user = await anext(users, None)
     except Exception:
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             detail="An unexpected error occurred while retrieving users.",
         )
+    return StreamingResponse(
+        _json_array(first_user, users), media_type="application/json"
+    )
+
+
+async def _json_array(
+    first: Optional[Dict[str, Any]], rest: AsyncIterator[Dict[str, Any]]
+) -> AsyncIterator[bytes]:
+    if first is None:
+        yield b"[]"
+        return
+    yield b"[" + to_json(first)
+    async for document in rest:
+        yield b"," + to_json(document)
+    yield b"]"
@@ -0,0 +1,33 @@
+# app/services/_redis.py
+
+import logging
+import redis.asyncio as redis
+from redis.utils import HIREDIS_AVAILABLE
+from app.config import get_settings
+
+logger = logging.getLogger("redis_pool")
+logger.setLevel(logging.INFO)
+
+# redis-py only uses the C parser when a compatible hiredis is importable and
+# silently falls back to the pure-Python one otherwise, so say so at startup.
+if not HIREDIS_AVAILABLE:
+    logger.warning(
+        "hiredis is not installed; Redis replies are parsed in pure Python. "
+        "Install redis[hiredis] (see requirements.txt)."
+    )
+
+# One connection pool per process for ordinary commands (cache reads and
+# writes, pipelined publishes). Calls are short, so the pool is bounded and
+# blocking; idle connections are health-checked before reuse.
+# Responses stay bytes so msgpack cache values reach the decoder untouched.
+redis_pool = redis.BlockingConnectionPool.from_url(
+    get_settings().redis_url,
+    max_connections=get_settings().redis_max_connections,
+    health_check_interval=30,
+)
+redis_client = redis.Redis(connection_pool=redis_pool)
+
+# Pub/sub holds its connection for as long as it listens, so subscribers get a
+# client of their own instead of pinning a slot in the command pool. Messages
+# are decoded to str, which is what the WebSocket relay sends as text frames.
+pubsub_client = redis.Redis.from_url(get_settings().redis_url, decode_responses=True)
@@ -9,23 +9,24 @@ Also, parsing JSON from an LLM can break if the LLM doesn’t follow instruction
 You might want to add robust error handling or a "Retry with stricter instructions" approach.
 """
 
-import asyncio
 from typing import Dict, Any, List, Optional
 from fastapi import HTTPException, status
-from app.services.redis_service import get_cached_value, set_cached_value
-from openai import OpenAI
+from app.services.redis_service import get_or_compute, make_cache_key
+from app.services.ai.ai_service import openai_client
+from app.utils.history_codec import pack_history
 from app.services.prompts.chunking_system_prompt import (
     get_chunking_system_prompt,
     generate_content_prompt,
 )
-import json
 import re
 import ast
+import orjson
 
-from app.config import settings
+from app.config import get_settings
 
-# Initialize OpenAI client
-openai_client = OpenAI(api_key=settings.openai_api_key)
+# A JSON payload inside ```json fences, or failing that the first [...] span.
+CODE_BLOCK_RE = re.compile(r"```json\s*([\s\S]*?)\s*```")
+JSON_ARRAY_RE = re.compile(r"(\[.*?\])", re.DOTALL)
 
 
 def extract_json_list_from_text(text: str) -> Optional[str]:
@@ -39,26 +40,32 @@ def extract_json_list_from_text(text: str) -> Optional[str]:
     try:
         text = text.strip()
         # Check for JSON inside triple backticks
-        code_block_match = re.search(r"```json\s*([\s\S]*?)\s*```", text)
+        code_block_match = CODE_BLOCK_RE.search(text)
         if code_block_match:
             json_text = code_block_match.group(1).strip()
         else:
             # Extract JSON-like text from the response
-            json_match = re.search(r"(\[.*?\])", text, re.DOTALL)
+            json_match = JSON_ARRAY_RE.search(text)
             if json_match:
                 json_text = json_match.group(1).strip()
             else:
                 return None  # No JSON found
 
-        # Attempt to convert the JSON-like text to a Python object using ast.literal_eval,
-        # which can handle single quotes correctly.
+        # Most responses are already valid JSON and can be returned as-is.
+        try:
+            orjson.loads(json_text)
+            return json_text
+        except orjson.JSONDecodeError:
+            pass
+
+        # Fall back to ast.literal_eval, which can handle single quotes correctly.
         try:
             data = ast.literal_eval(json_text)
         except Exception as e:
             return None
 
         # Convert the Python object back to a valid JSON string
-        valid_json = json.dumps(data)
+        valid_json = orjson.dumps(data).decode()
         return valid_json
 
     except Exception:
@@ -88,55 +95,48 @@ async def chunk_messages(
         ],
     """
 
-    # Cache key can be based on the entire conversation + user_data
-    cache_key = (
-        f"scheduling_plan:{str(conversation_history)}:{str(user_data)}:{str(ai_data)}"
+    # Cache key can be based on the entire conversation + user_data; the
+    # history is hashed in packed form, without repeating the dict keys.
+    cache_key = make_cache_key(
+        "scheduling_plan", pack_history(conversation_history), user_data, ai_data
     )
-    cached_plan = await get_cached_value(cache_key)
-    if cached_plan:
-        return cached_plan
 
-    print("userdata", user_data)
-
-    chunking_system_prompt = get_chunking_system_prompt()
-    content_prompt = generate_content_prompt(
-        user_prompt, user_data, ai_data, master_decision, conversation_history
-    )
-
-    def sync_llm_call():
-        return openai_client.chat.completions.create(
-            model=settings.openai_model,
-            messages=[
-                {"role": "system", "content": chunking_system_prompt},
-                {
-                    "role": "user",
-                    "content": content_prompt,
-                },
-            ],
-            temperature=0.7,
+    async def plan() -> List[Dict[str, Any]]:
+        chunking_system_prompt = get_chunking_system_prompt()
+        content_prompt = generate_content_prompt(
+            user_prompt, user_data, ai_data, master_decision, conversation_history
         )
 
-    try:
-        response = await asyncio.to_thread(sync_llm_call)
-        print(response)
-    except Exception as e:
-        raise HTTPException(
-            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
-            detail=f"Failed to chunk messages: {e}",
-        )
-
-    # Parse AI response.
-    raw_text = extract_json_list_from_text(response.choices[0].message.content)
+        try:
+            response = await openai_client.chat.completions.create(
+                model=get_settings().openai_model,
+                messages=[
+                    {"role": "system", "content": chunking_system_prompt},
+                    {
+                        "role": "user",
+                        "content": content_prompt,
+                    },
+                ],
+                temperature=0.7,
+            )
+        except Exception as e:
+            raise HTTPException(
+                status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+                detail=f"Failed to chunk messages: {e}",
+            )
 
-    try:
-        scheduling_plan = json.loads(raw_text)
-    except json.JSONDecodeError:
-        # If it fails, we fallback to a default or raise an error
-        raise HTTPException(
-            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
-            detail="Chunks is not valid JSON. LLM returned: " + raw_text,
-        )
+        # Parse AI response.
+        raw_text = extract_json_list_from_text(response.choices[0].message.content)
 
-    # Store in cache
-    await set_cached_value(cache_key, scheduling_plan, expire=3600)
-    return scheduling_plan
+        try:
+            scheduling_plan = orjson.loads(raw_text)
+        except orjson.JSONDecodeError:
+            # If it fails, we fallback to a default or raise an error
+            raise HTTPException(
+                status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+                detail="Chunks is not valid JSON. LLM returned: " + raw_text,
+            )
+        return scheduling_plan
+
+    # Concurrent identical requests share one LLM call.
+    return await get_or_compute(cache_key, plan, expire=3600)
@@ -7,114 +7,105 @@ builds a system prompt that informs the AI of its identity and the group context
 and then generates an AI response to the latest user message.
 """
 
+import asyncio
 import logging
-from typing import List, Optional, Dict, Any
+from typing import List, Optional, Dict, Any, Tuple
 
 from app.services.conversation_service import (
     get_conversation,
     update_conversation_history_record,
 )
 from app.services.ai.ai_service import get_ai_response
-from app.repositories.user_repository import get_user_by_id
-from app.repositories.ai_repository import get_ai_by_id as get_ai_by_id_repo
-from app.config import settings
-import sys
+from app.services.redis_pubsub import publish_message
+from app.services.redis_service import get_or_compute, make_cache_key
+from app.repositories.user_repository import get_users_by_ids
+from app.repositories.ai_repository import get_ais_by_ids
+from app.config import get_settings
 
-# Configure module-level logger
-logger = logging.getLogger(__name__)
-logger.setLevel(logging.DEBUG)
+# Records go through the root logger's handlers (see app.logging_config).
+logger = logging.getLogger("ai_group_service")
+logger.setLevel(logging.INFO)
 
-# Add handler if missing
-if not logger.hasHandlers():
-    handler = logging.StreamHandler(sys.stdout)
-    handler.setLevel(logging.DEBUG)
-    formatter = logging.Formatter("%(asctime)s - %(levelname)s - %(message)s")
-    handler.setFormatter(formatter)
-    logger.addHandler(handler)
+# Seconds a group's system prompt is reused before participant names and AI
+# details are read again.
+GROUP_PROMPT_CACHE_TTL = 300
 
 
-async def get_participant_names(participants: List[str]) -> List[str]:
+async def _fetch_participants(
+    participants: List[str], ai_ids: Optional[List[str]] = None
+) -> Tuple[Dict[str, Dict[str, Any]], Dict[str, Dict[str, Any]]]:
     """
-    Given a list of participant IDs, return their display names.
-
-    Tries to retrieve each participant as a user first; if not found, then as an AI.
-    If a participant cannot be found in either collection, its ID is returned.
+    Look up every participant as a user and as an AI, with one query per collection.
 
     :param participants: A list of participant IDs (strings).
-    :return: A list of display names corresponding to the participant IDs.
+    :param ai_ids: The participants already known to be AIs, if recorded on the
+        conversation; the others are then only looked up as users.
+    :return: The found users and AIs, each keyed by participant ID.
+    """
+    if ai_ids is None:
+        return await asyncio.gather(
+            get_users_by_ids(participants), get_ais_by_ids(participants)
+        )
+    user_ids = [pid for pid in participants if pid not in ai_ids]
+    return await asyncio.gather(get_users_by_ids(user_ids), get_ais_by_ids(ai_ids))
+
+
+def _participant_names(
+    participants: List[str],
+    users: Dict[str, Dict[str, Any]],
+    ais: Dict[str, Dict[str, Any]],
+) -> List[str]:
+    """
+    Resolve participant IDs to display names from already-fetched documents.
+
+    A user's username wins over an AI's name; unknown IDs are returned as-is.
     """
     names: List[str] = []
     for pid in participants:
-        name: Optional[str] = None
-        # Try as user
-        try:
-            user = await get_user_by_id(pid)
-            if user:
-                name = user.get("username")
-                logger.debug(f"Found user for {pid}: {name}")
-        except Exception as e:
-            logger.debug(f"Error fetching user for {pid}: {e}")
-        # Try as AI if not found as user
+        user = users.get(pid)
+        name: Optional[str] = user.get("username") if user else None
         if not name:
-            try:
-                ai = await get_ai_by_id_repo(pid)
-                if ai:
-                    name = ai.get("name")
-                    logger.debug(f"Found AI for {pid}: {name}")
-            except Exception as e:
-                logger.debug(f"Error fetching AI for {pid}: {e}")
+            ai = ais.get(pid)
+            name = ai.get("name") if ai else None
         names.append(name if name else pid)
-        logger.debug(f"Current participant names list: {names}")
     return names
 
 
-async def automate_group_ai_response(conversation_id: str) -> Optional[Dict[str, Any]]:
+async def get_participant_names(participants: List[str]) -> List[str]:
     """
-    Automatically generate an AI response for a group chat conversation.
+    Given a list of participant IDs, return their display names.
 
-    The function performs the following steps:
-      1. Loads the conversation and verifies that it is a group chat.
-      2. Retrieves participant names and identifies the AI agent in the group.
-      3. Constructs a system prompt incorporating the AI's identity and group context.
-      4. Extracts the latest user message (and sender) from the conversation history.
-      5. Constructs an input prompt for the AI (including the sender's name).
-      6. Generates an AI response using the OpenAI client.
-      7. Appends the AI response to the conversation history and updates the database record.
+    Each participant is looked up as a user first; if not found, then as an AI.
+    If a participant cannot be found in either collection, its ID is returned.
 
-    :param conversation_id: The conversation ID as a string.
-    :return: The updated conversation document if successful, otherwise None.
-    :raises Exception: If the AI response generation fails.
+    :param participants: A list of participant IDs (strings).
+    :return: A list of display names corresponding to the participant IDs.
     """
-    logger.info(f"Automating group AI response for conversation: {conversation_id}")
-    conversation = await get_conversation(conversation_id)
-    if not conversation or conversation.get("conversation_type") != "group":
-        logger.debug(
-            "Conversation is not a group chat or not found; skipping AI response."
-        )
-        return None
+    users, ais = await _fetch_participants(participants)
+    return _participant_names(participants, users, ais)
 
-    history: List[Dict[str, Any]] = conversation.get("history", [])
-    participants: List[str] = conversation.get("participants", [])
 
-    # Identify the AI in the group chat (assumes at most one AI)
-    ai_id: Optional[str] = None
-    for pid in participants:
-        try:
-            ai = await get_ai_by_id_repo(pid)
-            if ai:
-                ai_id = pid
-                logger.debug(f"AI found in conversation: {ai.get('name', 'AI')}")
-                break
-        except Exception as e:
-            logger.debug(f"Error checking AI for participant {pid}: {e}")
-
-    # Retrieve display names for all participants
-    names = await get_participant_names(participants)
-    logger.debug(f"Participant names: {names}")
+async def _group_context(
+    participants: List[str], ai_ids: Optional[List[str]]
+) -> Dict[str, Any]:
+    """
+    Build a group's system prompt and identify its AI participant.
+
+    :param participants: A list of participant IDs (strings).
+    :param ai_ids: The participants recorded as AIs on the conversation, if any.
+    :return: A dict with the AI's "ai_id" (or None), its "ai_name" and the "prompt".
+    """
+    # Fetch all participants at once, then identify the AI in the group chat
+    # (assumes at most one AI) and resolve display names. Conversations created
+    # before ai_participant_ids was recorded fall back to checking everyone.
+    users, ais = await _fetch_participants(participants, ai_ids)
+    ai_id: Optional[str] = next((pid for pid in participants if pid in ais), None)
+    names = _participant_names(participants, users, ais)
+    logger.debug("Participant names: %s", names)
 
     # Build the group system prompt, including AI identity if available
     if ai_id:
-        ai_details = await get_ai_by_id_repo(ai_id)
+        ai_details = ais[ai_id]
         ai_name = ai_details.get("name", "AI")
         ai_personality = ai_details.get("personality", "friendly")
         ai_description = ai_details.get("details", "An AI assistant.")
@@ -125,19 +116,45 @@ async def automate_group_ai_response(conversation_id: str) -> Optional[Dict[str,
             f"Respond appropriately in character."
         )
     else:
+        ai_name = "AI"
         group_prompt = f"This is a group chat with participants: {', '.join(names)}. Please respond appropriately."
-        logger.debug(f"Group prompt (no AI identity): {group_prompt}")
+        logger.debug("Group prompt (no AI identity): %s", group_prompt)
+    return {"ai_id": ai_id, "ai_name": ai_name, "prompt": group_prompt}
 
-    # Ensure the system prompt is in the conversation history (update or insert)
-    if not any(msg.get("role") == "system" for msg in history):
-        history.insert(0, {"role": "system", "content": group_prompt})
-    else:
-        for idx, msg in enumerate(history):
-            if msg.get("role") == "system":
-                history[idx] = {"role": "system", "content": group_prompt}
-                break
 
-    # Extract the latest user message and sender from the conversation history
+async def automate_group_ai_response(conversation_id: str) -> Optional[Dict[str, Any]]:
+    """
+    Automatically generate an AI response for a group chat conversation.
+
+    The function performs the following steps:
+      1. Loads the conversation and verifies that it is a group chat.
+      2. Extracts the latest user message (and sender) from the conversation history.
+      3. Retrieves participant names and identifies the AI agent in the group.
+      4. Constructs a system prompt incorporating the AI's identity and group context.
+      5. Constructs an input prompt for the AI (including the sender's name).
+      6. Generates an AI response using the OpenAI client, publishing the
+         text to the conversation's channel as it streams in.
+      7. Appends the AI response to the stored history and sets its leading
+         system message, without rewriting the rest of the history.
+
+    :param conversation_id: The conversation ID as a string.
+    :return: The updated conversation document if successful, otherwise None.
+    :raises Exception: If the AI response generation fails.
+    """
+    logger.info("Automating group AI response for conversation: %s", conversation_id)
+    conversation = await get_conversation(conversation_id)
+    if not conversation or conversation.get("conversation_type") != "group":
+        logger.debug(
+            "Conversation is not a group chat or not found; skipping AI response."
+        )
+        return None
+
+    history: List[Dict[str, Any]] = conversation.get("history", [])
+    participants: List[str] = conversation.get("participants", [])
+
+    # Extract the latest user message and sender from the conversation history.
+    # The backward scan stops at the first user message, and happens before
+    # any participant lookups so a turn with nothing to answer costs no queries.
     last_message: Optional[str] = None
     last_user_sender: Optional[str] = None
     for msg in reversed(history):
@@ -150,26 +167,55 @@ async def automate_group_ai_response(conversation_id: str) -> Optional[Dict[str,
         logger.debug("No valid user message found. Skipping AI response.")
         return None  # Nothing to respond to
 
+    # The prompt only depends on who takes part, so it is cached per
+    # participant set and a repeat turn skips the participant lookups.
+    context = await get_or_compute(
+        make_cache_key("group_prompt", sorted(participants)),
+        lambda: _group_context(participants, conversation.get("ai_participant_ids")),
+        expire=GROUP_PROMPT_CACHE_TTL,
+    )
+    ai_id: Optional[str] = context["ai_id"]
+    ai_name: str = context["ai_name"]
+    group_prompt: str = context["prompt"]
+
+    # Ensure the system prompt heads the conversation history (update or insert)
+    system_entry = {"role": "system", "content": group_prompt}
+    if history and history[0].get("role") == "system":
+        history[0] = system_entry
+    else:
+        history.insert(0, system_entry)
+
     # Build the input prompt, including sender's name if available
     if last_user_sender:
         ai_input = f"As {ai_name}, respond to this group chat message from {last_user_sender}: {last_message}"
     else:
         ai_input = f"As {ai_name}, respond to this group chat message: {last_message}"
-    logger.debug(f"AI input prompt: {ai_input}")
+    logger.debug("AI input prompt: %s", ai_input)
+
+    async def publish_delta(delta: str):
+        await publish_message(
+            conversation_id, {"type": "delta", "sender": ai_id, "content": delta}
+        )
 
-    # Generate the AI response
+    # Generate the AI response, streaming it to the group as it is produced
     try:
         ai_response = await get_ai_response(
-            ai_input, history, model=settings.openai_model
+            ai_input,
+            history,
+            model=get_settings().openai_model,
+            on_delta=publish_delta,
         )
-        logger.info(f"Generated AI response: {ai_response}")
+        logger.debug("Generated AI response: %s", ai_response)
     except Exception as e:
         raise Exception(f"Failed to generate group AI response: {e}")
 
-    # Append the AI response to the conversation history
-    history.append({"role": "assistant", "content": ai_response})
+    # Only the reply is appended and the head set, so user messages pushed
+    # while the reply streamed are kept; the interrupted flag isn't touched.
     updated_conversation = await update_conversation_history_record(
-        conversation_id, history
+        conversation_id,
+        [{"role": "assistant", "content": ai_response}],
+        interrupted=None,
+        system_message=system_entry,
     )
     logger.info("Conversation history updated with AI response.")
     return updated_conversation
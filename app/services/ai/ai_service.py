@@ -5,29 +5,123 @@ Implements business logic for generating AI responses using the OpenAI client.
 Handles caching via Redis and input validation.
 """
 
-import asyncio
-from typing import List, Dict, Any
-from openai import OpenAI
-from app.config import settings
-from app.services.redis_service import get_cached_value, set_cached_value
+from typing import Awaitable, Callable, List, Dict, Any, Optional
+from openai import AsyncOpenAI
+from app.config import get_settings
+from app.services.redis_service import get_or_compute, make_cache_key
+from app.utils.history_codec import pack_history
 from fastapi import HTTPException, status
-from app.services.prompts.master_system_prompt import get_master_system_prompt
-
-# Initialize the OpenAI client with the API key from settings.
-openai_client = OpenAI(api_key=settings.openai_api_key)
+from app.services.prompts.master_system_prompt import (
+    MASTER_SYSTEM_PROPMT,
+    get_master_context_prompt,
+)
+
+# Initialize the OpenAI client with the API key from settings. The async client
+# is shared module-wide (the chunking service uses it too) so its HTTP
+# connection pool is reused across requests.
+settings = get_settings()
+openai_client = AsyncOpenAI(api_key=settings.openai_api_key)
 openai_model = settings.openai_model
 
 
+async def close_openai_client():
+    """
+    Close the shared client's HTTP connection pool. Called from the FastAPI lifespan on shutdown.
+    """
+    await openai_client.close()
+
+
+# get_ai_response caches on the system message plus the last
+# AI_RESPONSE_CACHE_CONTEXT history entries: a reply is reused whenever the
+# recent context matches, even if older messages differ.
+AI_RESPONSE_CACHE_CONTEXT = 8
+
+
+def _response_cache_context(conversation_history: List[Dict[str, Any]]) -> List[list]:
+    """
+    The part of the history the response cache key depends on, in packed form.
+    """
+    tail = conversation_history[-AI_RESPONSE_CACHE_CONTEXT:]
+    head = conversation_history[:1]
+    if (
+        head
+        and head[0].get("role") == "system"
+        and len(conversation_history) > len(tail)
+    ):
+        tail = head + tail
+    return pack_history(tail)
+
+
+def compact_history(
+    conversation_history: List[Dict[str, Any]],
+    max_chars: int = settings.max_message_chars,
+) -> List[Dict[str, Any]]:
+    """
+    Strip repeated noise from the history before it is sent to the model.
+
+    Only the last system message is kept (group chats rebuild it every turn),
+    consecutive duplicates of the same (role, content) are collapsed, and any
+    content longer than max_chars keeps just its head and tail.
+    """
+    last_system = None
+    for index, msg in enumerate(conversation_history):
+        if msg["role"] == "system":
+            last_system = index
+
+    compacted: List[Dict[str, Any]] = []
+    previous = None
+    for index, msg in enumerate(conversation_history):
+        if msg["role"] == "system" and index != last_system:
+            continue
+        content = msg["content"]
+        if (msg["role"], content) == previous:
+            continue
+        previous = (msg["role"], content)
+        if isinstance(content, str) and len(content) > max_chars:
+            half = max_chars // 2
+            msg = {**msg, "content": f"{content[:half]}\n[trimmed]\n{content[-half:]}"}
+        compacted.append(msg)
+    return compacted
+
+
+def trim_history(
+    conversation_history: List[Dict[str, Any]], window: int = settings.history_window
+) -> List[Dict[str, Any]]:
+    """
+    Select the messages sent to the model: the first system message, if any,
+    followed by the last `window` non-system messages.
+
+    The stored history is left untouched; only the request is bounded.
+    """
+    system = next(
+        (msg for msg in conversation_history if msg["role"] == "system"), None
+    )
+    recent = [msg for msg in conversation_history if msg["role"] != "system"]
+    recent = recent[-window:] if window > 0 else []
+    return [system, *recent] if system is not None else recent
+
+
 async def get_ai_response(
-    prompt: str, conversation_history: List[Dict[str, Any]], model: str = openai_model
+    prompt: str,
+    conversation_history: List[Dict[str, Any]],
+    model: str = openai_model,
+    on_delta: Optional[Callable[[str], Awaitable[Any]]] = None,
 ) -> str:
     """
     Generate an AI response using the OpenAI client.
 
+    When on_delta is given the completion is streamed and each piece of text is
+    passed to it as it arrives (a cached response is passed in one piece); the
+    full text is still returned and cached once the stream ends.
+
+    Only the compacted trim_history window of conversation_history is sent to the model.
+    conversation_history is never modified; appending the reply is up to the caller.
+
     :param prompt: The user's input message.
     :param conversation_history: A list of dictionaries representing the conversation history.
                                  Each dictionary must contain 'role' and 'content' keys.
     :param model: The AI model to use (default is set in configuration).
+    :param on_delta: Optional coroutine function called with each streamed text delta.
     :return: The AI's response as a string.
     :raises ValueError: If inputs are invalid.
     :raises HTTPException: If the OpenAI API call fails.
@@ -42,31 +136,52 @@ async def get_ai_response(
             "The 'conversation_history' must be a list of dictionaries with 'role' and 'content' keys."
         )
 
-    # Create a cache key for this AI response.
-    cache_key = f"ai_response:{model}:{prompt}:{str(conversation_history)}"
-    cached_response = await get_cached_value(cache_key)
-    if cached_response:
-        return cached_response
-
-    def sync_call(conversation_history):
-        return openai_client.chat.completions.create(
-            model=openai_model,
-            messages=conversation_history,
-        )
-
-    try:
-        response = await asyncio.to_thread(sync_call, conversation_history)
-    except Exception as e:
-        raise HTTPException(
-            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
-            detail=f"Failed to generate AI response: {e}",
-        )
+    # Only a bounded, de-noised window of the history is sent, so prompt size
+    # (and the cache key) no longer grow with the conversation.
+    messages = trim_history(compact_history(conversation_history))
 
-    ai_response = response.choices[0].message.content.strip()
-    # Append the AI response to the conversation history.
-    conversation_history.append({"role": "assistant", "content": ai_response})
-    # Cache the response.
-    await set_cached_value(cache_key, ai_response, expire=3600)
+    # Create a cache key for this AI response.
+    cache_key = make_cache_key(
+        "ai_response", model, prompt, _response_cache_context(messages)
+    )
+    streamed = False
+
+    async def generate() -> str:
+        nonlocal streamed
+        try:
+            if on_delta is None:
+                response = await openai_client.chat.completions.create(
+                    model=openai_model,
+                    messages=messages,
+                )
+                return response.choices[0].message.content.strip()
+
+            streamed = True
+            parts: List[str] = []
+            stream = await openai_client.chat.completions.create(
+                model=openai_model,
+                messages=messages,
+                stream=True,
+            )
+            async for chunk in stream:
+                if not chunk.choices:
+                    continue
+                delta = chunk.choices[0].delta.content
+                if delta:
+                    parts.append(delta)
+                    await on_delta(delta)
+            return "".join(parts).strip()
+        except Exception as e:
+            raise HTTPException(
+                status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+                detail=f"Failed to generate AI response: {e}",
+            )
+
+    # Concurrent identical requests share one completion; only the caller that
+    # started it sees the streamed deltas, the others get the text in one piece.
+    ai_response = await get_or_compute(cache_key, generate, expire=3600)
+    if on_delta is not None and not streamed:
+        await on_delta(ai_response)
     return ai_response
 
 
@@ -96,12 +211,16 @@ async def master_ai(
             "The 'conversation_history' must be a list of dictionaries with 'role' and 'content' keys."
         )
 
-    master_system_prompt = get_master_system_prompt(
-        user_data, ai_data, conversation_history
+    # The history was validated above, so only the per-request context is
+    # built here; the static instructions are a module-level constant. Like
+    # get_ai_response, only the HISTORY_WINDOW most recent turns (plus the
+    # system message) go into the prompt.
+    master_system_prompt = MASTER_SYSTEM_PROPMT + get_master_context_prompt(
+        user_data, ai_data, trim_history(conversation_history)
     )
 
-    def sync_call():
-        return openai_client.chat.completions.create(
+    try:
+        response = await openai_client.chat.completions.create(
             model=settings.openai_model,
             messages=[
                 {"role": "system", "content": master_system_prompt},
@@ -112,9 +231,6 @@ async def master_ai(
             ],
             temperature=0.7,
         )
-
-    try:
-        response = await asyncio.to_thread(sync_call)
     except Exception as e:
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
@@ -1,6 +1,11 @@
 # app/services/chat_service.py
 
-from app.repositories.chat_repository import save_message, get_conversation_messages
+from typing import Any, Dict, Tuple
+from app.repositories.chat_repository import (
+    save_message,
+    save_message_and_append,
+    get_conversation_messages,
+)
 from app.models import Message
 
 
@@ -8,11 +13,29 @@ async def send_message(conversation_id: str, message: Message) -> dict:
     """
     Save a message to the conversation and return the saved document.
     """
-    message_dict = message.dict()  # Convert Pydantic model to dict
+    message_dict = message.model_dump()  # Convert Pydantic model to dict
     saved_message = await save_message(conversation_id, message_dict)
     return saved_message
 
 
+async def send_message_and_append(
+    conversation_id: str, message: Message
+) -> Tuple[dict, Dict[str, Any]]:
+    """
+    Save a user message and append it to the conversation's history in one step.
+
+    :return: The saved message document and the updated conversation.
+    """
+    history_entry = {
+        "role": "user",
+        "sender": message.sender,
+        "content": message.content,
+    }
+    return await save_message_and_append(
+        conversation_id, message.model_dump(), history_entry
+    )
+
+
 async def fetch_conversation_history(conversation_id: str) -> list:
     """
     Retrieve the entire message history for a conversation.
@@ -4,67 +4,104 @@ Conversation service module.
 Implements business logic for conversation creation, retrieval, listing, and history updates.
 """
 
-from typing import List, Dict, Any
-from datetime import datetime
+import asyncio
+from typing import List, Dict, Any, Optional, Tuple, Union
+from datetime import datetime, timezone
+from cachetools import TTLCache
 from fastapi import HTTPException, status
 from app.models import ConversationCreate
 from app.repositories.conversation_repository import (
     create_conversation,
     get_conversation_by_id,
+    is_participant,
     list_conversations_for_user,
     update_conversation_history_record as update_conversation_history_record_repo,
 )
-from app.repositories.user_repository import get_user_by_id
-from app.repositories.ai_repository import get_ai_by_id
+from app.repositories.user_repository import get_users_by_ids
+from app.repositories.ai_repository import get_ais_by_ids
 import logging
 
 logger = logging.getLogger("conversation_service")
 logger.setLevel(logging.INFO)
 
+# Participant lists never change after a conversation is created, so membership
+# checks are cached in-process for PARTICIPANT_CACHE_TTL seconds. Concurrent
+# checks for the same (conversation, user) pair share one query.
+PARTICIPANT_CACHE_SIZE = 50_000
+PARTICIPANT_CACHE_TTL = 60
+_participant_cache: TTLCache = TTLCache(
+    maxsize=PARTICIPANT_CACHE_SIZE, ttl=PARTICIPANT_CACHE_TTL
+)
+_participant_lookups: Dict[Tuple[str, str], asyncio.Task] = {}
+
 
 async def create_new_conversation(
-    conversation: ConversationCreate, skip_participant_check: bool = False
+    conversation: Union[ConversationCreate, Dict[str, Any]],
+    skip_participant_check: bool = False,
 ) -> Dict[str, Any]:
     """
     Create a new conversation.
 
     For group chats that include both users and AI agents, each participant is verified
-    to exist either in the users collection or the AI collection (unless skip_participant_check is True).
+    to exist either in the users collection or the AI collection (unless skip_participant_check is True),
+    and the IDs of the AI participants are stored as ai_participant_ids.
 
-    :param conversation: A ConversationCreate instance containing conversation data.
+    :param conversation: A ConversationCreate instance, or an already-built
+                         conversation document (used as-is).
     :param skip_participant_check: If True, bypasses participant verification.
     :return: The created conversation document.
     :raises HTTPException: If a participant ID is invalid or does not exist.
     """
-    # Convert the Pydantic model to a dictionary.
-    conversation_data: Dict[str, Any] = conversation
+    # The model is dumped once, in full: exclude_unset would drop the
+    # conversation_type default that group replies depend on.
+    if isinstance(conversation, ConversationCreate):
+        conversation_data: Dict[str, Any] = conversation.model_dump()
+    else:
+        conversation_data = conversation
 
     if not skip_participant_check:
-        for participant_id in conversation_data.get("participants", []):
-            user = await get_user_by_id(participant_id)
-            if not user:
-                ai = await get_ai_by_id(participant_id)
-                if not ai:
-                    raise HTTPException(
-                        status_code=status.HTTP_400_BAD_REQUEST,
-                        detail=f"Participant with ID {participant_id} does not exist.",
-                    )
-    conversation_data["created_at"] = datetime.utcnow()
+        participants = conversation_data.get("participants", [])
+        # One $in query per collection instead of two lookups per participant.
+        users, ais = await asyncio.gather(
+            get_users_by_ids(participants, projection={"_id": 1}),
+            get_ais_by_ids(participants),
+        )
+        for participant_id in participants:
+            if participant_id not in users and participant_id not in ais:
+                raise HTTPException(
+                    status_code=status.HTTP_400_BAD_REQUEST,
+                    detail=f"Participant with ID {participant_id} does not exist.",
+                )
+        # Saves group replies from having to work out which participants are AIs.
+        conversation_data["ai_participant_ids"] = [
+            participant_id for participant_id in participants if participant_id in ais
+        ]
+    conversation_data["created_at"] = datetime.now(timezone.utc)
     logger.info(
-        f"Creating conversation with participants: {conversation_data.get('participants')}"
+        "Creating conversation with participants: %s",
+        conversation_data.get("participants"),
     )
     return await create_conversation(conversation_data)
 
 
-async def get_conversation(conversation_id: str) -> Dict[str, Any]:
+async def get_conversation(
+    conversation_id: str,
+    projection: Optional[Dict[str, Any]] = None,
+    history_limit: Optional[int] = None,
+) -> Dict[str, Any]:
     """
     Retrieve a conversation by its ID.
 
     :param conversation_id: The conversation ID as a string.
+    :param projection: Optional MongoDB projection limiting the returned fields.
+    :param history_limit: Optional maximum number of history entries to read
+                          (see get_conversation_by_id).
     :return: The conversation document.
     :raises HTTPException: If the conversation is not found.
     """
-    conversation = await get_conversation_by_id(conversation_id)
+    conversation = await get_conversation_by_id(
+        conversation_id, projection, history_limit
+    )
     if not conversation:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND, detail="Conversation not found."
@@ -72,6 +109,35 @@ async def get_conversation(conversation_id: str) -> Dict[str, Any]:
     return conversation
 
 
+async def is_conversation_participant(conversation_id: str, user_id: str) -> bool:
+    """
+    Check whether a user is a participant of a conversation.
+
+    :param conversation_id: The conversation ID as a string.
+    :param user_id: The user's ID.
+    :return: True if the conversation exists and includes the user.
+    :raises HTTPException: If the conversation ID is invalid.
+    """
+    key = (conversation_id, user_id)
+    cached = _participant_cache.get(key)
+    if cached is not None:
+        return cached
+
+    task = _participant_lookups.get(key)
+    if task is None:
+        task = asyncio.create_task(is_participant(conversation_id, user_id))
+        _participant_lookups[key] = task
+
+        def store(done: asyncio.Task):
+            _participant_lookups.pop(key, None)
+            if not done.cancelled() and done.exception() is None:
+                _participant_cache[key] = done.result()
+
+        task.add_done_callback(store)
+    # Shielded so one caller disconnecting doesn't cancel the shared query.
+    return await asyncio.shield(task)
+
+
 async def list_user_conversations(user_id: str) -> List[Dict[str, Any]]:
     """
     List all conversations for a given user.
@@ -83,13 +149,21 @@ async def list_user_conversations(user_id: str) -> List[Dict[str, Any]]:
 
 
 async def update_conversation_history_record(
-    conversation_id: str, history: List[Dict[str, Any]], interrupted: bool = False
+    conversation_id: str,
+    new_messages: List[Dict[str, Any]],
+    interrupted: Optional[bool] = False,
+    prepend_messages: Optional[List[Dict[str, Any]]] = None,
+    system_message: Optional[Dict[str, Any]] = None,
 ) -> Dict[str, Any]:
     """
-    Update a conversation's history field (and optionally its interrupted status).
+    Append messages to a conversation's history (and set its interrupted status,
+    unless interrupted is None), optionally inserting prepend_messages at its
+    front or replacing its leading system message with system_message.
     """
-
-    # Call the repository function with both history and interrupted
     return await update_conversation_history_record_repo(
-        conversation_id, history, interrupted
+        conversation_id,
+        new_messages,
+        interrupted,
+        prepend_messages,
+        system_message=system_message,
     )
@@ -1,3 +1,5 @@
+import orjson
+
 MASTER_SYSTEM_PROPMT = (
     "You are the master AI, the central intelligence controlling all AI personalities in this system.\n"
     "Your goal is to maximize user engagement and strategically lead users to subscribe.\n"
@@ -71,32 +73,25 @@ MASTER_SYSTEM_PROPMT = (
 )
 
 
-def get_master_system_prompt(user_data, ai_data, conversation_history):
+def get_master_context_prompt(user_data, ai_data, conversation_history):
     """
-    Generate a description of what the master AI will do in the action step
+    Build the per-request part of the master prompt, appended to MASTER_SYSTEM_PROPMT.
 
     :param user_data: The user's data.
     :param ai_data: The AI's data.
     :param conversation_history: The conversation history.
 
-    :return: The master AI's response as a string.
-    """
-
-    if not isinstance(conversation_history, list) or not all(
-        isinstance(msg, dict) and "role" in msg and "content" in msg
-        for msg in conversation_history
-    ):
-        raise ValueError(
-            "The 'conversation_history' must be a list of dictionaries with 'role' and 'content' keys."
-        )
+    Each value is written as compact JSON rather than its Python repr; values
+    orjson can't encode natively (e.g. ObjectId) fall back to str().
 
-    system_prompt = MASTER_SYSTEM_PROPMT
-    context_prompt = f"""
-    Conversation so far: {conversation_history}
-    User data: {user_data}
-    AI data: {ai_data}
+    :return: The context block as a string.
     """
-
-    complete_prompt = system_prompt + context_prompt
-
-    return complete_prompt
+    return (
+        "\nConversation so far: "
+        + orjson.dumps(conversation_history, default=str).decode()
+        + "\nUser data: "
+        + orjson.dumps(user_data, default=str).decode()
+        + "\nAI data: "
+        + orjson.dumps(ai_data, default=str).decode()
+        + "\n"
+    )
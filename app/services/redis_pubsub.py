@@ -1,44 +1,202 @@
 # app/services/redis_pubsub.py
 
-import json
-from app.config import settings
+import asyncio
+import logging
+import orjson
+from app.config import get_settings
 import redis.asyncio as redis
-from datetime import datetime
+from typing import Dict, List, Optional, Tuple
+from app.services._redis import pubsub_client, redis_client
 
-# Create a shared async Redis client.
-redis_client = redis.Redis.from_url(settings.redis_url, decode_responses=True)
+logger = logging.getLogger("redis_pubsub")
+logger.setLevel(logging.INFO)
 
 
-# Function to serialize datetime objects
-def json_serializer(obj):
-    if isinstance(obj, datetime):
-        return obj.isoformat()  # Convert datetime to string
-    raise TypeError(f"Type {type(obj)} not serializable")
+class _PublishBatcher:
+    """
+    Buffers publishes and sends them through one non-transactional pipeline
+    per batch, so a burst of messages costs a single Redis round trip.
+
+    enqueue returns straight away and a failed send is only logged. All
+    messages go through one queue, so they keep their order.
+    """
+
+    def __init__(self, max_batch_size: int, window: float):
+        self.max_batch_size = max_batch_size
+        self.window = window
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._queue: Optional[asyncio.Queue] = None
+        self._task: Optional[asyncio.Task] = None
+
+    def _ensure_running(self) -> None:
+        loop = asyncio.get_running_loop()
+        if self._loop is not loop or self._task is None or self._task.done():
+            self._loop = loop
+            self._queue = asyncio.Queue()
+            self._task = loop.create_task(self._run())
+
+    def enqueue(self, channel: str, payload: bytes) -> None:
+        self._ensure_running()
+        self._queue.put_nowait((channel, payload))
+
+    async def close(self) -> None:
+        """
+        Flush pending publishes and stop the background flusher.
+        """
+        if self._task is None or self._loop is not asyncio.get_running_loop():
+            return
+        self._queue.put_nowait(None)
+        await self._task
+        self._task = None
+
+    async def _run(self) -> None:
+        while True:
+            item = await self._queue.get()
+            if item is None:
+                return
+            batch: List[Tuple[str, bytes]] = [item]
+            if self._queue.qsize() < self.max_batch_size - 1:
+                await asyncio.sleep(self.window)
+            stop = False
+            while len(batch) < self.max_batch_size and not self._queue.empty():
+                item = self._queue.get_nowait()
+                if item is None:
+                    stop = True
+                    break
+                batch.append(item)
+            await self._flush(batch)
+            if stop:
+                return
+
+    async def _flush(self, batch: List[Tuple[str, bytes]]) -> None:
+        pipe = redis_client.pipeline(transaction=False)
+        for channel, payload in batch:
+            pipe.publish(channel, payload)
+        try:
+            results = await pipe.execute(raise_on_error=False)
+        except Exception as e:
+            results = [e] * len(batch)
+        for (channel, _), result in zip(batch, results):
+            if isinstance(result, Exception):
+                logger.warning("Failed to publish to %s: %s", channel, result)
+
+
+_settings = get_settings()
+_publish_batcher = _PublishBatcher(
+    _settings.redis_batch_size, _settings.redis_batch_window_ms / 1000
+)
 
 
 async def publish_message(channel: str, message: dict):
     """
-    Publish a JSON message to a Redis channel.
+    Publish a JSON message to a Redis channel without waiting for it to be sent.
+
+    orjson writes datetimes as ISO 8601 strings natively, so no default hook is
+    needed. The message goes out in the next pipelined batch; a failure is
+    logged rather than raised.
+    """
+    _publish_batcher.enqueue(channel, orjson.dumps(message))
+
+
+async def flush_pending_publishes():
     """
-    # Convert message to JSON and handle datetime serialization
-    message_json = json.dumps(message, default=json_serializer)
-    await redis_client.publish(channel, message_json)
+    Send any buffered publishes and stop the background flusher.
+    Called from the FastAPI lifespan on shutdown.
+    """
+    await _publish_batcher.close()
 
 
-async def subscribe_to_channel(channel: str):
+class PubSubHub:
     """
-    Subscribe to a Redis channel and yield messages as they come in.
-    Use this in an async loop.
+    One Redis pub/sub connection per process, shared by every local subscriber.
+
+    A channel is subscribed when its first queue registers and unsubscribed
+    when the last one leaves. A single reader task puts each message's raw
+    JSON string on the channel's queues without blocking; a queue that is full
+    drops the message rather than stalling every other channel.
     """
-    pubsub = redis_client.pubsub()
-    await pubsub.subscribe(channel)
-    try:
-        async for message in pubsub.listen():
-            # Redis sends several message types; we only care about messages of type "message"
-            if message["type"] == "message":
+
+    def __init__(self, client: redis.Redis):
+        self._client = client
+        self._pubsub = None
+        self._reader: Optional[asyncio.Task] = None
+        self._queues: Dict[str, List[asyncio.Queue]] = {}
+        # Serializes SUBSCRIBE/UNSUBSCRIBE so they reach Redis in decision order.
+        self._lock = asyncio.Lock()
+
+    async def subscribe(self, channel: str, queue: asyncio.Queue) -> None:
+        """
+        Start delivering the channel's messages to the queue.
+
+        :raises redis.RedisError: If the SUBSCRIBE could not be sent.
+        """
+        async with self._lock:
+            queues = self._queues.setdefault(channel, [])
+            queues.append(queue)
+            if len(queues) == 1:
+                if self._pubsub is None:
+                    self._pubsub = self._client.pubsub()
                 try:
-                    yield json.loads(message["data"])
+                    await self._pubsub.subscribe(channel)
                 except Exception:
-                    continue
-    finally:
-        await pubsub.unsubscribe(channel)
+                    del self._queues[channel]
+                    raise
+        if self._reader is None or self._reader.done():
+            self._reader = asyncio.create_task(self._read())
+
+    async def unsubscribe(self, channel: str, queue: asyncio.Queue) -> None:
+        """
+        Stop delivering the channel's messages to the queue (no-op if it isn't registered).
+        """
+        async with self._lock:
+            queues = self._queues.get(channel)
+            if not queues or queue not in queues:
+                return
+            queues.remove(queue)
+            if queues:
+                return
+            del self._queues[channel]
+            try:
+                await self._pubsub.unsubscribe(channel)
+            except Exception as e:
+                # Messages for a channel without queues are simply ignored.
+                logger.warning("Failed to unsubscribe from %s: %s", channel, e)
+
+    async def close(self) -> None:
+        """
+        Stop the reader and release the pub/sub connection.
+        """
+        if self._reader is not None:
+            self._reader.cancel()
+            self._reader = None
+        if self._pubsub is not None:
+            await self._pubsub.aclose()
+            self._pubsub = None
+        self._queues.clear()
+
+    async def _read(self) -> None:
+        while True:
+            try:
+                message = await self._pubsub.get_message(
+                    ignore_subscribe_messages=True, timeout=None
+                )
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                # The next read reconnects, and redis-py resubscribes on connect.
+                logger.warning("Redis pub/sub read failed, retrying: %s", e)
+                await asyncio.sleep(1)
+                continue
+            if message is None or message["type"] != "message":
+                continue
+            for queue in self._queues.get(message["channel"], ()):
+                try:
+                    queue.put_nowait(message["data"])
+                except asyncio.QueueFull:
+                    logger.warning(
+                        "Subscriber queue for %s is full; dropping a message.",
+                        message["channel"],
+                    )
+
+
+pubsub_hub = PubSubHub(pubsub_client)
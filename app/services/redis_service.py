@@ -1,11 +1,54 @@
 # app/services/redis_service.py
 
-import json
-from app.config import settings
-import redis.asyncio as redis
+import asyncio
+import hashlib
+import logging
+import msgpack
+import orjson
+from datetime import datetime
+from typing import Any, Awaitable, Callable, Dict, Set
+from app.services._redis import redis_client
 
-# Create an async Redis client using the URL from your configuration.
-redis_client = redis.Redis.from_url(settings.redis_url, decode_responses=True)
+logger = logging.getLogger("redis_service")
+logger.setLevel(logging.INFO)
+
+# Computations for a cache key whose result isn't in Redis yet, shared by
+# get_or_compute callers, and cache writes still in flight.
+_inflight: Dict[str, asyncio.Task] = {}
+_pending_writes: Set[asyncio.Task] = set()
+
+
+# Every cache key starts with this namespace, so the application's entries can
+# be found (e.g. with SCAN MATCH "zance:ai_response:*") and invalidated in bulk.
+CACHE_KEY_NAMESPACE = "zance"
+
+
+def make_cache_key(prefix: str, *parts) -> str:
+    """
+    Build a fixed-size cache key from arbitrary JSON-like inputs.
+
+    The parts are serialized canonically (sorted keys) and hashed with
+    blake2b, so the key is "zance:<prefix>:<32 hex chars>" however large the
+    inputs are.
+
+    :param prefix: Namespace for the key (e.g. "ai_response").
+    :param parts: The values the cached result depends on.
+    :return: The cache key.
+    """
+    payload = orjson.dumps(parts, option=orjson.OPT_SORT_KEYS, default=str)
+    digest = hashlib.blake2b(payload, digest_size=16).hexdigest()
+    return f"{CACHE_KEY_NAMESPACE}:{prefix}:{digest}"
+
+
+# Marks a msgpack-encoded cache value. Values without it were written as JSON
+# or plain strings before the switch and are still read back as such.
+MSGPACK_PREFIX = b"\x01"
+
+
+def _msgpack_default(value):
+    if isinstance(value, datetime):
+        return value.isoformat()
+    raise TypeError(f"Cannot cache value of type {type(value).__name__}")
 
 
 async def get_cached_value(key: str):
@@ -16,14 +59,16 @@ async def get_cached_value(key: str):
     :return: The cached value, or None if not found.
     """
     value = await redis_client.get(key)
-    if value is not None:
-        try:
-            # Attempt to load the value from JSON if possible.
-            return json.loads(value)
-        except json.JSONDecodeError:
-            # If not JSON, return the raw string.
-            return value
-    return None
+    if value is None:
+        return None
+    if value.startswith(MSGPACK_PREFIX):
+        return msgpack.unpackb(value[1:], raw=False)
+    try:
+        # Attempt to load the value from JSON if possible.
+        return orjson.loads(value)
+    except orjson.JSONDecodeError:
+        # If not JSON, return the raw string.
+        return value.decode()
 
 
 async def set_cached_value(key: str, value, expire: int = 3600):
@@ -31,13 +76,78 @@ async def set_cached_value(key: str, value, expire: int = 3600):
     Cache a value in Redis with an optional expiration time (default is 3600 seconds / 1 hour).
 
     :param key: The Redis key under which the value will be stored.
-    :param value: The value to cache. If not a string, it will be converted to JSON.
+    :param value: The value to cache, encoded with msgpack (datetimes as ISO 8601 strings).
+    :param expire: Expiration time in seconds.
+    """
+    payload = MSGPACK_PREFIX + msgpack.packb(
+        value, default=_msgpack_default, use_bin_type=True
+    )
+    await redis_client.set(key, payload, ex=expire)
+
+
+def _write_done(task: asyncio.Task):
+    _pending_writes.discard(task)
+    if not task.cancelled() and task.exception() is not None:
+        logger.warning("Background cache write failed: %s", task.exception())
+
+
+def set_cached_value_later(key: str, value, expire: int = 3600) -> asyncio.Task:
+    """
+    Cache a value without waiting for Redis; a failed write is logged, not raised.
+
+    :param key: The Redis key under which the value will be stored.
+    :param value: The value to cache (see set_cached_value).
     :param expire: Expiration time in seconds.
+    :return: The task performing the write.
     """
-    # Convert the value to JSON if it's not already a string.
-    if not isinstance(value, str):
-        value = json.dumps(value)
-    await redis_client.set(key, value, ex=expire)
+    task = asyncio.create_task(set_cached_value(key, value, expire=expire))
+    _pending_writes.add(task)
+    task.add_done_callback(_write_done)
+    return task
+
+
+def _forget_failed(key: str, task: asyncio.Task):
+    if task.cancelled() or task.exception() is not None:
+        _inflight.pop(key, None)
+
+
+async def _compute_and_store(
+    key: str, compute: Callable[[], Awaitable[Any]], expire: int
+) -> Any:
+    value = await compute()
+    # Waiters get the value right away; the computation stays registered
+    # until the write lands, so nobody recomputes it in between.
+    write = set_cached_value_later(key, value, expire=expire)
+    write.add_done_callback(lambda _: _inflight.pop(key, None))
+    return value
+
+
+async def get_or_compute(
+    key: str, compute: Callable[[], Awaitable[Any]], expire: int = 3600
+) -> Any:
+    """
+    Return the cached value for a key, computing and caching it on a miss.
+
+    Concurrent misses for the same key in this process share a single
+    computation, so a burst of identical requests makes one upstream call. The
+    computation is shielded: a caller that goes away doesn't cancel it for the
+    others. The result is returned without waiting for the cache write.
+
+    :param key: The Redis key for the cached value.
+    :param compute: Coroutine function producing the value on a miss.
+    :param expire: Expiration time in seconds for a freshly computed value.
+    :return: The cached or computed value.
+    """
+    cached = await get_cached_value(key)
+    if cached:
+        return cached
+
+    task = _inflight.get(key)
+    if task is None:
+        task = asyncio.create_task(_compute_and_store(key, compute, expire))
+        _inflight[key] = task
+        task.add_done_callback(lambda done: _forget_failed(key, done))
+    return await asyncio.shield(task)
 
 
 async def delete_cached_value(key: str):
@@ -6,56 +6,68 @@ Now uses the phone number as the unique identifier; the username is no longer re
 """
 
 import logging
-from datetime import datetime
+from datetime import datetime, timezone
+from cachetools import TTLCache
 from fastapi import HTTPException, status
+from pymongo.errors import DuplicateKeyError
 from app.models import UserCreate
 from app.repositories.user_repository import (
     get_user_by_phone_number,
     create_user,
-    get_all_users,
+    iter_all_users,
     get_user_by_id,
     get_user_by_username,
 )
-from app.utils.password import hash_password, verify_password
+from app.utils.password import hash_password_async, verify_password_async
 from app.utils.auth import create_access_token
-from typing import Dict
+from typing import AsyncIterator, Dict, Optional
 
 logger = logging.getLogger("user_service")
 logger.setLevel(logging.INFO)
 
+# Users found by authenticate_user, keyed by username, so a burst of login
+# attempts on one account reads it from MongoDB once. Entries live
+# LOGIN_CACHE_TTL seconds and hold only the fields a login needs.
+LOGIN_CACHE_SIZE = 10_000
+LOGIN_CACHE_TTL = 10
+LOGIN_PROJECTION = {"_id": 1, "username": 1, "password": 1, "phone_number": 1}
+_login_cache: TTLCache = TTLCache(maxsize=LOGIN_CACHE_SIZE, ttl=LOGIN_CACHE_TTL)
+
 
 async def register_user(user: UserCreate) -> dict:
     """
     Register a new user:
-      - Check if the phone number is already registered (uniqueness check).
       - Hash the password.
-      - Save the new user to the database.
+      - Save the new user to the database. The unique index on phone_number
+        rejects an already registered number in the same call, so concurrent
+        sign-ups can't both succeed.
 
     :param user: A UserCreate instance containing user signup data.
     :return: The created user document.
     :raises HTTPException: If the phone number is already in use or registration fails.
     """
     try:
-        # Check if phone number already exists
-        existing_user = await get_user_by_phone_number(user.phone_number)
-        if existing_user:
-            raise HTTPException(
-                status_code=status.HTTP_400_BAD_REQUEST,
-                detail="Phone number already registered.",
-            )
         new_user = {
             "username": user.username,
-            "password": hash_password(user.password),
+            "password": await hash_password_async(user.password),
             "phone_number": user.phone_number,
-            "created_at": datetime.utcnow(),
+            "created_at": datetime.now(timezone.utc),
         }
-        created_user = await create_user(new_user)
-        logger.info(f"User with phone {user.phone_number} registered successfully.")
+        try:
+            created_user = await create_user(new_user)
+        except DuplicateKeyError:
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail="Phone number already registered.",
+            )
+        # A cached login for the same username must not hide the new account.
+        _login_cache.pop(user.username, None)
+        logger.info("User with phone %s registered successfully.", user.phone_number)
         return created_user
     except HTTPException:
         raise
     except Exception as e:
-        logger.error(f"Error registering user with phone {user.phone_number}: {e}")
+        logger.error("Error registering user with phone %s: %s", user.phone_number, e)
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             detail="Internal server error during registration.",
@@ -77,15 +89,19 @@ async def authenticate_user(username: str, password: str) -> dict:
     :raises HTTPException: If authentication fails.
     """
     # (This function uses username for now. You could add a phone-based authentication if needed.)
-    from app.repositories.user_repository import get_user_by_username
-
     try:
-        stored_user = await get_user_by_username(username)
-        if not stored_user:
-            raise HTTPException(
-                status_code=status.HTTP_401_UNAUTHORIZED, detail="Invalid credentials."
+        stored_user = _login_cache.get(username)
+        if stored_user is None:
+            stored_user = await get_user_by_username(
+                username, projection=LOGIN_PROJECTION
             )
-        if not verify_password(password, stored_user["password"]):
+            if not stored_user:
+                raise HTTPException(
+                    status_code=status.HTTP_401_UNAUTHORIZED,
+                    detail="Invalid credentials.",
+                )
+            _login_cache[username] = stored_user
+        if not await verify_password_async(password, stored_user["password"]):
             raise HTTPException(
                 status_code=status.HTTP_401_UNAUTHORIZED, detail="Invalid credentials."
             )
@@ -94,34 +110,34 @@ async def authenticate_user(username: str, password: str) -> dict:
             "username": stored_user["username"],
         }
         token = create_access_token(token_payload)
-        logger.info(f"User '{username}' authenticated successfully.")
+        logger.info("User '%s' authenticated successfully.", username)
         return {"access_token": token, "token_type": "bearer"}
     except HTTPException:
         raise
     except Exception as e:
-        logger.error(f"Error during authentication for user '{username}': {e}")
+        logger.error("Error during authentication for user '%s': %s", username, e)
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             detail="Internal server error during authentication.",
         )
 
 
-async def get_users() -> list:
+async def stream_users(
+    skip: int = 0, limit: Optional[int] = None
+) -> AsyncIterator[dict]:
     """
-    Retrieve all users.
+    Stream users one document at a time, optionally one page at a time.
 
-    :return: A list of user documents.
-    :raises HTTPException: If user retrieval fails.
+    :param skip: Number of users to skip.
+    :param limit: Maximum number of users to yield (None yields all remaining users).
+    :return: An async iterator of user documents.
     """
     try:
-        users = await get_all_users()
-        return users
+        async for user in iter_all_users(skip, limit):
+            yield user
     except Exception as e:
-        logger.error(f"Error retrieving all users: {e}")
-        raise HTTPException(
-            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
-            detail="Internal server error retrieving users.",
-        )
+        logger.error("Error streaming users: %s", e)
+        raise
 
 
 async def get_user(info: Dict):
@@ -153,7 +169,7 @@ async def get_user(info: Dict):
     except HTTPException:
         raise
     except Exception as e:
-        logger.error(f"Error retrieving user with info {info}: {e}")
+        logger.error("Error retrieving user with info %s: %s", info, e)
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             detail="Internal server error retrieving user.",
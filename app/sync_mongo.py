@@ -1,55 +1,64 @@
+from typing import Optional
 from pymongo import MongoClient
-from bson.objectid import ObjectId
-from app.config import settings
+from pymongo.collection import Collection
+from app.config import get_settings
+from app.database import mongo_client_options
+from app.repositories.history_update import capped_history
+from app.utils.object_id import parse_object_id
 import logging
 
 logger = logging.getLogger("sync_mongo")
 logger.setLevel(logging.INFO)
 
-# Connect with PyMongo
-mongo_uri = settings.mongo_uri
-client = MongoClient(mongo_uri)
+# The PyMongo client is created on first use rather than at import, so worker
+# processes forked from a parent that imported this module open their own
+# sockets (see reset_sync_client).
+_client: Optional[MongoClient] = None
+_conversations: Optional[Collection] = None
 
-db_name = settings.mongo_db_name
-sync_db = client[db_name]
 
-
-def get_sync_conversation_by_id(conversation_id: str):
-    try:
-        oid = ObjectId(conversation_id)
-    except:
-        logger.error(f"Invalid conversation ID: {conversation_id}")
-        return None
-
-    doc = sync_db.conversations.find_one({"_id": oid})
-    if doc:
-        doc["_id"] = str(doc["_id"])  # Convert ObjectId to string
-    return doc
+def get_sync_conversations() -> Collection:
+    """
+    Return the conversations collection on this process's client, creating it on first use.
+    """
+    global _client, _conversations
+    if _conversations is None:
+        settings = get_settings()
+        _client = MongoClient(settings.mongo_uri, **mongo_client_options())
+        _conversations = _client[settings.mongo_db_name].conversations
+    return _conversations
 
 
-def update_sync_conversation_history(
-    conversation_id: str, history: list, interrupted: bool = None
-):
+def reset_sync_client():
     """
-    Update the conversation's history and optionally 'interrupted' field.
+    Forget the cached client without closing it.
+
+    Used in freshly forked worker processes so they open their own sockets
+    instead of sharing the parent's.
     """
-    try:
-        oid = ObjectId(conversation_id)
-    except:
-        logger.error(f"Invalid conversation ID: {conversation_id}")
-        return None
+    global _client, _conversations
+    _client = None
+    _conversations = None
 
-    logger.info(f"Updating conversation {conversation_id} with history: {history}")
 
-    update_doc = {"history": history}
-    if interrupted is not None:
-        update_doc["interrupted"] = interrupted
+def append_sync_conversation_messages(conversation_id: str, messages: list) -> bool:
+    """
+    Append messages to a conversation's history unless it has been interrupted.
 
-    result = sync_db.conversations.update_one({"_id": oid}, {"$set": update_doc})
+    The interrupted check and the append happen in one update, so delivering a
+    chunk costs a single round trip. The history is capped like the async
+    repository's appends, keeping a leading system message.
 
-    if result.modified_count == 1:
-        logger.info(f"Successfully updated conversation {conversation_id}")
-        return get_sync_conversation_by_id(conversation_id)
+    :return: True if the messages were appended, False if the conversation is
+             missing, interrupted, or the ID is invalid.
+    """
+    oid = parse_object_id(conversation_id)
+    if oid is None:
+        logger.error("Invalid conversation ID: %s", conversation_id)
+        return False
 
-    logger.warning(f"Conversation {conversation_id} was not modified.")
-    return None
+    result = get_sync_conversations().update_one(
+        {"_id": oid, "interrupted": {"$ne": True}},
+        [{"$set": {"history": capped_history(messages)}}],
+    )
+    return result.modified_count == 1
@@ -1,51 +1,59 @@
-import time
 from celery.utils.log import get_task_logger
 from app.celery_app import celery_app
-from app.sync_mongo import (
-    get_sync_conversation_by_id,
-    update_sync_conversation_history,
-)
+from app.sync_mongo import append_sync_conversation_messages
 
 logger = get_task_logger(__name__)
 
 
+def _delay(chunk_info: dict) -> float:
+    return chunk_info.get("delay_seconds") or 0
+
+
 @celery_app.task
-def deliver_chunks_task(chat_id: str, chunks: list):
+def deliver_chunks_task(chat_id: str, chunks: list, due: bool = False):
     """
     Celery task that delivers chunked messages according to scheduling_plan.
     Uses PyMongo for synchronous Mongo calls (no Motor).
-    """
-    logger.warning(f"Scheduling plan chunks: {chunks}")
 
-    for chunk_info in chunks:
-        delay_seconds = chunk_info.get("delay_seconds", 0)
-        chunk_content = chunk_info.get("content", "")
+    Instead of sleeping between chunks, the task appends the chunks that are
+    due and re-enqueues itself with a countdown for the rest, so a worker slot
+    is only held while writing. A chunk followed by chunks without a delay is
+    appended together with them in one update.
 
-        logger.info(
-            f"Sleeping for {delay_seconds} seconds before sending next chunk..."
-        )
-        time.sleep(delay_seconds)
-
-        # Fetch latest conversation
-        conversation_doc = get_sync_conversation_by_id(chat_id)
-        if not conversation_doc:
-            logger.error("Conversation not found. Stopping chunk delivery.")
-            break
-        if conversation_doc.get("interrupted", False):
-            logger.warning("Conversation was interrupted. Stopping chunk delivery.")
-            break
-
-        # Update conversation history
-        conversation_history = conversation_doc.get("history", [])
-        conversation_history.append({"role": "assistant", "content": chunk_content})
-        logger.info(f"Appending chunk: {chunk_content} to conversation {chat_id}")
-
-        update_result = update_sync_conversation_history(chat_id, conversation_history)
-
-        if not update_result:
-            logger.error(
-                f"Failed to update conversation {chat_id}. Stopping chunk delivery."
+    :param chat_id: The conversation to deliver to.
+    :param chunks: The remaining chunks, each with "content" and "delay_seconds".
+    :param due: True once the first chunk's delay has already been waited out.
+    """
+    if not chunks:
+        logger.info("Chunk delivery completed for %s", chat_id)
+        return
+    if not due:
+        logger.info("Scheduling plan chunks: %s", chunks)
+        if _delay(chunks[0]) > 0:
+            deliver_chunks_task.apply_async(
+                (chat_id, chunks, True), countdown=_delay(chunks[0])
             )
-            break
-
-    logger.info(f"Chunk delivery completed for {chat_id}")
+            return
+
+    count = 1
+    while count < len(chunks) and _delay(chunks[count]) <= 0:
+        count += 1
+    messages = [
+        {"role": "assistant", "content": chunk_info.get("content", "")}
+        for chunk_info in chunks[:count]
+    ]
+    logger.info("Appending %s chunk(s) to conversation %s", count, chat_id)
+
+    if not append_sync_conversation_messages(chat_id, messages):
+        logger.warning(
+            "Conversation %s is missing or was interrupted. Stopping chunk delivery.",
+            chat_id,
+        )
+        return
+
+    rest = chunks[count:]
+    if not rest:
+        logger.info("Chunk delivery completed for %s", chat_id)
+        return
+    logger.info("Next chunk for %s in %s seconds", chat_id, _delay(rest[0]))
+    deliver_chunks_task.apply_async((chat_id, rest, True), countdown=_delay(rest[0]))
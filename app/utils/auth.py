@@ -1,8 +1,16 @@
 # app/utils/auth.py
+import time
 import jwt
-from datetime import datetime, timedelta
+from cachetools import TTLCache
+from datetime import timedelta
 from fastapi import HTTPException, status
-from app.config import settings
+from app.config import get_settings
+
+# Verified token payloads, keyed by the raw token. Entries live at most
+# TOKEN_CACHE_TTL seconds and a hit is still checked against the token's "exp".
+TOKEN_CACHE_SIZE = 10_000
+TOKEN_CACHE_TTL = 60
+_token_cache: TTLCache = TTLCache(maxsize=TOKEN_CACHE_SIZE, ttl=TOKEN_CACHE_TTL)
 
 
 def create_access_token(
@@ -10,11 +18,13 @@ def create_access_token(
 ) -> str:
     """
     Create a JWT access token with an expiration time.
+
+    "exp" is written as the integer timestamp it encodes to anyway, so PyJWT
+    doesn't have to convert a datetime on every call.
     """
     to_encode = data.copy()
-    expire = datetime.utcnow() + expires_delta
-    to_encode.update({"exp": expire})
-    encoded_jwt = jwt.encode(to_encode, settings.secret_key, algorithm="HS256")
+    to_encode["exp"] = int(time.time() + expires_delta.total_seconds())
+    encoded_jwt = jwt.encode(to_encode, get_settings().secret_key, algorithm="HS256")
     return encoded_jwt
 
 
@@ -22,13 +32,25 @@ def decode_access_token(token: str) -> dict:
     """
     Decode and verify a JWT token.
 
+    Tokens verified in the last TOKEN_CACHE_TTL seconds skip the signature
+    check; only their expiry is re-checked.
+
     :param token: The JWT token as a string.
     :return: The decoded payload if valid.
     :raises HTTPException: If the token is invalid or expired.
     """
+    payload = _token_cache.get(token)
+    if payload is not None:
+        if payload.get("exp", float("inf")) > time.time():
+            return dict(payload)
+        _token_cache.pop(token, None)
+        raise HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED, detail="Token has expired."
+        )
     try:
-        payload = jwt.decode(token, settings.secret_key, algorithms=["HS256"])
-        return payload
+        payload = jwt.decode(token, get_settings().secret_key, algorithms=["HS256"])
+        _token_cache[token] = payload
+        return dict(payload)
     except jwt.ExpiredSignatureError:
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED, detail="Token has expired."
@@ -0,0 +1,23 @@
+# app/utils/history_codec.py
+
+from typing import Any, Dict, List
+
+# Positional form of a history entry, used when hashing it into cache keys:
+# [role code, content]. Unknown roles keep their name in place of the code, so
+# distinct roles never hash alike.
+ROLE_CODES = {"user": 0, "assistant": 1, "system": 2}
+
+
+def pack_history(history: List[Dict[str, Any]]) -> List[list]:
+    """
+    Convert a list of {"role", "content"} dicts to compact [role code, content] pairs.
+
+    Only role and content are kept; other keys (e.g. "sender") are dropped.
+
+    :param history: The conversation history.
+    :return: The history in positional form.
+    """
+    return [
+        [ROLE_CODES.get(msg["role"], msg["role"]), msg["content"]] for msg in history
+    ]
+
@@ -0,0 +1,44 @@
+# app/utils/object_id.py
+
+from typing import Optional
+from bson import ObjectId
+from fastapi import HTTPException, status
+
+
+def parse_object_id(value: str) -> Optional[ObjectId]:
+    """
+    Convert a 24-character hex string into an ObjectId, or return None if it isn't one.
+
+    bytes.fromhex does the hex validation in C and the 12 raw bytes are handed
+    to ObjectId directly, so bson never has to parse the string itself.
+
+    :param value: The ID as a 24-character hex string.
+    :return: The corresponding ObjectId, or None if the value is not a valid ObjectId string.
+    """
+    if isinstance(value, str) and len(value) == 24:
+        try:
+            raw = bytes.fromhex(value)
+        except ValueError:
+            return None
+        # fromhex skips whitespace, so a 24-char string can still decode short.
+        if len(raw) == 12:
+            return ObjectId(raw)
+    return None
+
+
+def to_object_id(value: str, label: str) -> ObjectId:
+    """
+    Convert a 24-character hex string into an ObjectId (see parse_object_id).
+
+    :param value: The ID as a 24-character hex string.
+    :param label: What the ID refers to (e.g. "AI", "user"), used in the error message.
+    :return: The corresponding ObjectId.
+    :raises HTTPException: If the value is not a valid ObjectId string.
+    """
+    oid = parse_object_id(value)
+    if oid is None:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"Invalid {label} id: {value}. It must be a 24-character hex string.",
+        )
+    return oid
@@ -1,5 +1,6 @@
 # app/utils/password.py
 
+import asyncio
 import bcrypt
 
 
@@ -18,3 +19,20 @@ def verify_password(plain_password: str, hashed_password: str) -> bool:
     return bcrypt.checkpw(
         plain_password.encode("utf-8"), hashed_password.encode("utf-8")
     )
+
+
+async def hash_password_async(password: str) -> str:
+    """
+    Hash the password in the default executor, keeping the event loop free.
+
+    bcrypt releases the GIL while hashing, so concurrent calls run in parallel
+    on the executor's threads.
+    """
+    return await asyncio.to_thread(hash_password, password)
+
+
+async def verify_password_async(plain_password: str, hashed_password: str) -> bool:
+    """
+    Verify a password in the default executor, keeping the event loop free.
+    """
+    return await asyncio.to_thread(verify_password, plain_password, hashed_password)
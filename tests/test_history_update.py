@@ -0,0 +1,110 @@
+# tests/test_history_update.py
+#
+# Runs the capped-history update pipelines against a real MongoDB (MONGO_URI,
+# default mongodb://localhost:27017); skipped when no server is reachable.
+# Run with: python -m unittest discover tests
+
+import os
+import unittest
+from pymongo import MongoClient
+from pymongo.errors import PyMongoError
+from app.repositories.history_update import HISTORY_MAX_LENGTH, capped_history
+
+SYSTEM = {"role": "system", "content": "You are the group's AI."}
+
+
+def _messages(count: int, start: int = 0) -> list:
+    return [{"role": "user", "content": f"m{i}"} for i in range(start, start + count)]
+
+
+class CappedHistoryTest(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        uri = os.environ.get("MONGO_URI", "mongodb://localhost:27017")
+        cls.client = MongoClient(uri, serverSelectionTimeoutMS=500)
+        try:
+            cls.client.admin.command("ping")
+        except PyMongoError:
+            cls.client.close()
+            raise unittest.SkipTest(f"No MongoDB server reachable at {uri}")
+        cls.collection = cls.client["zance_test"]["conversations"]
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.client.drop_database("zance_test")
+        cls.client.close()
+
+    def _append(self, history: list, new_messages: list, **kwargs) -> list:
+        doc_id = self.collection.insert_one({"history": history}).inserted_id
+        self.collection.update_one(
+            {"_id": doc_id},
+            [{"$set": {"history": capped_history(new_messages, **kwargs)}}],
+        )
+        return self.collection.find_one({"_id": doc_id})["history"]
+
+    def test_cap_keeps_leading_system_message(self):
+        history = self._append(
+            [SYSTEM, *_messages(HISTORY_MAX_LENGTH)], _messages(3, 1000)
+        )
+        self.assertEqual(len(history), HISTORY_MAX_LENGTH)
+        self.assertEqual(history[0], SYSTEM)
+        self.assertEqual(history[1]["content"], "m4")
+        self.assertEqual(history[-1]["content"], "m1002")
+
+    def test_cap_without_system_message_drops_oldest(self):
+        history = self._append(_messages(HISTORY_MAX_LENGTH + 1), _messages(1, 1000))
+        self.assertEqual(len(history), HISTORY_MAX_LENGTH)
+        self.assertEqual(history[0]["content"], "m2")
+        self.assertEqual(history[-1]["content"], "m1000")
+
+    def test_prepend_survives_a_full_history(self):
+        history = self._append(
+            _messages(HISTORY_MAX_LENGTH), _messages(1, 1000), prepend_messages=[SYSTEM]
+        )
+        self.assertEqual(len(history), HISTORY_MAX_LENGTH)
+        self.assertEqual(history[0], SYSTEM)
+        self.assertEqual(history[1]["content"], "m2")
+        self.assertEqual(history[-1]["content"], "m1000")
+
+    def test_prepend_is_skipped_when_head_has_same_role(self):
+        history = self._append(
+            [SYSTEM, *_messages(HISTORY_MAX_LENGTH)],
+            _messages(1, 1000),
+            prepend_messages=[{"role": "system", "content": "other"}],
+        )
+        self.assertEqual(len(history), HISTORY_MAX_LENGTH)
+        self.assertEqual(history[0], SYSTEM)
+        self.assertEqual(history[-1]["content"], "m1000")
+
+    def test_system_message_replaces_head_of_full_history(self):
+        new_system = {"role": "system", "content": "Updated prompt."}
+        history = self._append(
+            [SYSTEM, *_messages(HISTORY_MAX_LENGTH)],
+            _messages(1, 1000),
+            system_message=new_system,
+        )
+        self.assertEqual(len(history), HISTORY_MAX_LENGTH)
+        self.assertEqual(history[0], new_system)
+        self.assertEqual(sum(msg["role"] == "system" for msg in history), 1)
+        self.assertEqual(history[-1]["content"], "m1000")
+
+    def test_system_message_is_inserted_when_missing(self):
+        history = self._append(_messages(2), _messages(1, 1000), system_message=SYSTEM)
+        self.assertEqual(history, [SYSTEM, *_messages(2), *_messages(1, 1000)])
+
+    def test_append_to_missing_history(self):
+        doc_id = self.collection.insert_one({}).inserted_id
+        self.collection.update_one(
+            {"_id": doc_id}, [{"$set": {"history": capped_history(_messages(1))}}]
+        )
+        self.assertEqual(
+            self.collection.find_one({"_id": doc_id})["history"], _messages(1)
+        )
+
+    def test_dollar_content_is_stored_literally(self):
+        message = {"role": "user", "content": "$history"}
+        self.assertEqual(self._append([], [message]), [message])
+
+
+if __name__ == "__main__":
+    unittest.main()